@@ -0,0 +1,142 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import asyncio
+import concurrent.futures
+import functools
+import os
+import typing
+from ClassIndex import ClassIndex
+from CompilationEngine import CompilationError
+from JackCompiler import Compiler, OUTPUT_EXTENSIONS
+
+
+def read_source(input_path: str) -> bytes:
+    with open(input_path, 'rb') as input_file:
+        return input_file.read()
+
+
+def write_output(output_path: str, output: typing.Union[str, bytes]) -> None:
+    """Writes a compiled unit, renaming it into place once it is complete."""
+    temp_path = output_path + ".tmp"
+    with open(temp_path, 'w' if isinstance(output, str) else 'wb'
+              ) as output_file:
+        output_file.write(output)
+    os.replace(temp_path, output_path)
+
+
+def compile_source(compiler: Compiler, source: bytes
+                   ) -> typing.Tuple[typing.Union[str, bytes, None],
+                                     typing.Optional[str]]:
+    """Compiles a single class, catching its error so that it can cross
+    process boundaries.
+
+    Returns:
+        typing.Tuple: the compiled unit and None, or None and a description
+        of the error that stopped the compilation.
+    """
+    try:
+        return compiler.compile(source), None
+    except CompilationError as error:
+        return None, f'{type(error).__name__}: {error}'
+
+
+def index_sources(input_paths: typing.Iterable[str]) -> ClassIndex:
+    """
+    Returns:
+        ClassIndex: the signatures of the classes of the given ".jack" files.
+        A file that cannot be read or scanned is left out, and reported when
+        its unit is compiled.
+    """
+    index = ClassIndex()
+    for input_path in input_paths:
+        try:
+            index.add_paths([input_path])
+        except (OSError, CompilationError):
+            pass
+    return index
+
+
+async def compile_unit(input_path: str, compiler: Compiler,
+                       executor: concurrent.futures.Executor,
+                       slots: asyncio.Semaphore) -> typing.Tuple[
+                           str, typing.Optional[str]]:
+    """Reads, compiles and writes a single unit. The file operations run on
+    the event loop's default thread pool and the compilation on the given
+    executor, so that other units keep both busy meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    async with slots:
+        try:
+            source = await loop.run_in_executor(None, read_source, input_path)
+            output, error = await loop.run_in_executor(
+                executor, compile_source, compiler, source)
+            if error is None:
+                output_path = os.path.splitext(input_path)[0] + \
+                    OUTPUT_EXTENSIONS[compiler.output_format]
+                await loop.run_in_executor(
+                    None, write_output, output_path, output)
+        except OSError as os_error:
+            error = f'{type(os_error).__name__}: {os_error}'
+    return input_path, None if error is None else f'{input_path}: {error}'
+
+
+async def compile_many(
+        input_paths: typing.Iterable[str], concurrency: int = 4,
+        optimizations: typing.Collection[str] = (),
+        index: typing.Optional[ClassIndex] = None,
+        output_format: str = "text",
+        executor: typing.Optional[concurrent.futures.Executor] = None
+) -> typing.AsyncIterator[typing.Tuple[str, typing.Optional[str]]]:
+    """Compiles files next to their sources, like compile_path(), with the
+    reads and writes of some units overlapping the compilation of others.
+
+        async for input_path, error in compile_many(paths, concurrency=8):
+            ...
+
+    Args:
+        input_paths (typing.Iterable[str]): paths of the ".jack" files.
+        concurrency (int): the most units in progress at once.
+        optimizations (typing.Collection[str]): the optimizations to apply,
+        except "inline" and "dce", which need the whole program, see
+        build().
+        index (ClassIndex): the signatures of the program's classes. By
+        default the classes of the given files are indexed first, as build()
+        does.
+        output_format (str): the encoding of the output.
+        executor (concurrent.futures.Executor): runs the compilations. By
+        default a pool of `concurrency` worker processes is created for the
+        call and shut down once it is done.
+
+    Returns:
+        typing.AsyncIterator[typing.Tuple[str, typing.Optional[str]]]: the
+        path of every unit as soon as it is done, with a description of its
+        error, or None if it compiled successfully.
+    """
+    loop = asyncio.get_running_loop()
+    input_paths = list(input_paths)
+    if index is None:
+        index = await loop.run_in_executor(None, index_sources, input_paths)
+    compiler = Compiler(optimizations, index, output_format)
+    owned_executor = executor is None
+    if owned_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=concurrency)
+    slots = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.ensure_future(
+        compile_unit(input_path, compiler, executor, slots))
+        for input_path in input_paths]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        if owned_executor:
+            # waiting for the workers to exit must not block the event loop
+            await loop.run_in_executor(None, functools.partial(
+                executor.shutdown, wait=True, cancel_futures=True))
@@ -0,0 +1,113 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Turns binary VM files back into VM text:
+
+    python3 BinaryVMReader.py <file.vmb> [<file.vmb> ...]
+
+writes the commands of every file to a ".vm" file next to it.
+"""
+import os
+import sys
+import typing
+from BinaryVMWriter import LABEL_OPCODES, MAGIC, SEGMENT_OPCODES, VERSION
+from IntermediateCode import Opcode, Subroutine
+from VMWriter import VMWriter
+
+
+class BinaryVMReader:
+    """Decodes the functions of a file written by BinaryVMWriter."""
+
+    def __init__(self, data: bytes) -> None:
+        """
+        Args:
+            data (bytes): the contents of a binary VM file.
+        """
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a binary VM file")
+        if data[len(MAGIC):len(MAGIC) + 1] != bytes([VERSION]):
+            raise ValueError("unsupported binary VM version")
+        self.data = data
+        self.position = len(MAGIC) + 1
+        self.strings: typing.List[str] = []
+
+    def read_varint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            byte = self.data[self.position]
+            self.position += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def read_subroutine(self) -> Subroutine:
+        """Decodes the function at the current position."""
+        data = self.data
+        strings = self.strings
+        read_varint = self.read_varint
+        for _ in range(read_varint()):
+            length = read_varint()
+            strings.append(
+                data[self.position:self.position + length].decode("utf-8"))
+            self.position += length
+        subroutine = Subroutine(strings[read_varint()], read_varint())
+        append = subroutine.append
+        for _ in range(read_varint()):
+            opcode = data[self.position]
+            self.position += 1
+            if opcode in SEGMENT_OPCODES:
+                segment = data[self.position]
+                self.position += 1
+                append(opcode, segment, read_varint())
+            elif opcode == Opcode.CALL:
+                name = strings[read_varint()]
+                append(opcode, operand=read_varint(), name=name)
+            elif opcode in LABEL_OPCODES:
+                append(opcode, name=strings[read_varint()])
+            else:
+                append(opcode)
+        return subroutine
+
+    def __iter__(self) -> typing.Iterator[Subroutine]:
+        try:
+            while self.position < len(self.data):
+                yield self.read_subroutine()
+        except IndexError:
+            raise ValueError("truncated binary VM file") from None
+
+    def to_text(self) -> typing.List[str]:
+        """
+        Returns:
+            typing.List[str]: the file's VM commands, each ending in a
+            newline, exactly as VMWriter writes them.
+        """
+        return [command for subroutine in self
+                for command in VMWriter.serialize(subroutine)]
+
+
+def read_path(input_path: str) -> typing.List[str]:
+    """
+    Args:
+        input_path (str): path of a binary VM file.
+
+    Returns:
+        typing.List[str]: its VM commands.
+    """
+    with open(input_path, 'rb') as input_file:
+        return BinaryVMReader(input_file.read()).to_text()
+
+
+if "__main__" == __name__:
+    if len(sys.argv) < 2:
+        sys.exit("Invalid usage, please use: BinaryVMReader <file.vmb> ...")
+    for argument_path in sys.argv[1:]:
+        output_path = os.path.splitext(argument_path)[0] + ".vm"
+        commands = read_path(argument_path)
+        with open(output_path, 'w') as output_file:
+            output_file.writelines(commands)
@@ -0,0 +1,112 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from IntermediateCode import NO_NAME, Opcode, Pass, Subroutine
+from VMWriter import FLUSH_THRESHOLD, VMWriter
+
+# the first bytes of every binary VM file, followed by the format version
+MAGIC = b'JVMB'
+VERSION = 1
+BINARY_EXTENSION = ".vmb"
+# opcodes followed by a segment byte and a varint index
+SEGMENT_OPCODES = frozenset([Opcode.PUSH, Opcode.POP])
+# opcodes followed by the varint id of a label
+LABEL_OPCODES = frozenset([Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO])
+
+
+def write_varint(data: bytearray, value: int) -> None:
+    """Appends an unsigned integer, 7 bits per byte from the least significant
+    ones, with the high bit set on every byte but the last.
+    """
+    if value < 0:
+        raise ValueError(f"cannot encode the negative operand {value}")
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+class BinaryVMWriter(VMWriter):
+    """
+    Writes VM functions into a binary stream in a compact encoding, which
+    BinaryVMReader turns back into the exact text VMWriter would have written.
+
+    A file starts with MAGIC and a version byte, followed by one record per
+    function:
+        - the number of names first used by the function, and each of them
+          as a varint length and its UTF-8 bytes. Names are numbered in the
+          order they appear in the file, and refer to functions and labels.
+        - the id of the function's name, its number of locals and its number
+          of instructions, as varints.
+        - its instructions, each a one-byte opcode (see IntermediateCode)
+          followed by a one-byte segment and a varint index for push and pop,
+          a varint name id for label, goto and if-goto, and a varint name id
+          and a varint argument count for call.
+    """
+
+    def __init__(self, output_stream: typing.BinaryIO,
+                 flush_threshold: int = FLUSH_THRESHOLD,
+                 passes: typing.Sequence[Pass] = ()) -> None:
+        """
+        Args:
+            output_stream (typing.BinaryIO): receives the encoded functions.
+            flush_threshold (int): number of buffered instructions after which
+            the buffer is flushed.
+            passes (typing.Sequence[Pass]): rewrite every subroutine, in
+            order, before it is encoded.
+        """
+        super().__init__(output_stream, flush_threshold, passes)
+        self.data = bytearray(MAGIC)
+        self.data.append(VERSION)
+        self.pending = 0
+        self.string_ids: typing.Dict[str, int] = {}
+
+    def flush(self) -> None:
+        """Writes all buffered functions to the output stream."""
+        if not self.data:
+            return
+        self.output_stream.write(bytes(self.data))
+        self.data.clear()
+        self.pending = 0
+
+    def emit(self, subroutine: Subroutine) -> None:
+        """Encodes a function into the buffer.
+
+        Args:
+            subroutine (Subroutine): the function's instructions.
+        """
+        data = self.data
+        string_ids = self.string_ids
+        new_strings = [name for name in dict.fromkeys(
+            [subroutine.name] + subroutine.strings) if name not in string_ids]
+        write_varint(data, len(new_strings))
+        for name in new_strings:
+            string_ids[name] = len(string_ids)
+            encoded = name.encode("utf-8")
+            write_varint(data, len(encoded))
+            data += encoded
+        write_varint(data, string_ids[subroutine.name])
+        write_varint(data, subroutine.n_locals)
+        write_varint(data, len(subroutine))
+        # the file-wide id of every name in the subroutine's own table
+        ids = [string_ids[name] for name in subroutine.strings]
+        for opcode, segment, operand, name in zip(
+                subroutine.opcodes, subroutine.segments, subroutine.operands,
+                subroutine.names):
+            data.append(opcode)
+            if opcode in SEGMENT_OPCODES:
+                data.append(segment)
+                write_varint(data, operand)
+            elif opcode == Opcode.CALL:
+                write_varint(data, ids[name])
+                write_varint(data, operand)
+            elif name != NO_NAME:
+                write_varint(data, ids[name])
+        self.pending += len(subroutine) + 1
+        if self.pending >= self.flush_threshold:
+            self.flush()
@@ -0,0 +1,248 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import json
+import mmap
+import os
+import typing
+from ClassIndex import ClassIndex
+from JackTokenizer import CompilationError, JackTokenizer, \
+    SUBROUTINE_KEYWORDS, CLASS_VAR_KEYWORDS, KEYWORD
+
+# the lexemes a type follows in a declaration: the type of class variables
+# and locals, and the return type of subroutines
+TYPE_PREFIXES = SUBROUTINE_KEYWORDS | CLASS_VAR_KEYWORDS | {"var"}
+
+MANIFEST_NAME = ".jackcache.json"
+
+
+def compiler_version() -> str:
+    """
+    Returns:
+        str: a digest of the compiler's own sources, so that editing the
+        compiler invalidates everything it compiled before.
+    """
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".py"):
+            with open(os.path.join(directory, filename), 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+def analyze_source(lexemes: typing.Iterable[typing.Tuple[str, str]]
+                   ) -> typing.Tuple[str, str, typing.List[str],
+                                     typing.List[str]]:
+    """Extracts what other units may depend on from a class's source, without
+    compiling it. The lexemes are consumed as they are scanned, and only
+    those of declarations are kept.
+
+    Args:
+        lexemes (typing.Iterable[typing.Tuple[str, str]]): the (group,
+        lexeme) pairs of a single Jack class, see JackTokenizer.scan().
+
+    Returns:
+        typing.Tuple[str, str, typing.List[str], typing.List[str]]: the class
+        name, a digest of its class-level signature (class variable
+        declarations and subroutine headers), the sorted names it depends on,
+        and its declaration lexemes for ClassIndex.add_declarations(). The
+        names it depends on are those it references as "name.member" and the
+        types of its variables, parameters and subroutines, since calls made
+        through a variable are checked against the class of its type.
+    """
+    class_name = None
+    signature = hashlib.sha1()
+    references = set()
+    declarations = []
+    in_declaration = False
+    in_parameters = False
+    previous = (None, None)
+    for group, lexeme in lexemes:
+        if group == "word" and lexeme not in KEYWORD and (
+                previous[1] in TYPE_PREFIXES or
+                in_parameters and previous[1] in ("(", ",")):
+            references.add(lexeme)
+        if in_declaration and lexeme in ("(", ")"):
+            in_parameters = lexeme == "("
+        if class_name is None and previous[1] == "class":
+            class_name = lexeme
+            declarations += ["class", lexeme]
+        if lexeme in SUBROUTINE_KEYWORDS or lexeme in CLASS_VAR_KEYWORDS:
+            in_declaration = True
+        if in_declaration:
+            if lexeme in ("{", ";"):
+                in_declaration = False
+            signature.update(lexeme.encode() + b" ")
+            if group != "stringConstant":
+                declarations.append(lexeme)
+        elif lexeme == "." and previous[0] == "word":
+            references.add(previous[1])
+        previous = (group, lexeme)
+    return class_name, signature.hexdigest(), sorted(references), \
+        declarations
+
+
+class BuildCache:
+    """An on-disk manifest of the units compiled by previous runs. A unit is
+    up to date if its source, the compiler, the compilation settings and the
+    signatures of the classes it references are all unchanged, and its output
+    still exists.
+    """
+
+    def __init__(self, manifest_path: str, settings: str = "",
+                 output_extension: str = ".vm") -> None:
+        """Loads the manifest, discarding it if it was written by a different
+        compiler version or with different settings.
+
+        Args:
+            manifest_path (str): path of the manifest file.
+            settings (str): the options that affect the compiler's output.
+            output_extension (str): the extension of the compiled files.
+        """
+        self.manifest_path = manifest_path
+        self.version = compiler_version()
+        self.settings = settings
+        self.output_extension = output_extension
+        self.units: typing.Dict[str, dict] = {}
+        self.sources: typing.Dict[str, dict] = {}
+        self.signatures: typing.Dict[str, str] = {}
+        # the declarations of every scanned class, for the compilation units
+        self.index = ClassIndex()
+        try:
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") == self.version and \
+                manifest.get("settings") == self.settings:
+            self.units = manifest.get("units", {})
+
+    def scan(self, input_paths: typing.List[str]) -> typing.Dict[str, str]:
+        """Hashes the given sources, collects their class signatures and
+        indexes their declarations.
+        Must be called with every unit of the build before is_fresh(), which
+        only accepts the units scanned without an error. A source that is
+        unchanged since the last scan by this instance is not read again,
+        which makes repeated builds of a resident compiler cheap. Sources
+        scanned or recorded before that no longer exist, such as renamed
+        ones, are forgotten, along with their manifest entries and
+        declarations.
+
+        Args:
+            input_paths (typing.List[str]): paths of the ".jack" files.
+
+        Returns:
+            typing.Dict[str, str]: the error of every source that could not be
+            read, such as one that was removed, or not scanned, such as one
+            with a character that starts no token, by path.
+        """
+        self.forget_missing(input_paths)
+        errors = {}
+        for input_path in input_paths:
+            try:
+                stat = os.stat(input_path)
+                stamp = [stat.st_mtime_ns, stat.st_size]
+                if self.sources.get(input_path, {}).get("stamp") == stamp:
+                    continue
+                with open(input_path, 'rb') as input_file:
+                    # mapped and scanned as bytes, so that large sources are
+                    # never decoded or held as a whole
+                    source = JackTokenizer.map_source(input_file)
+                    try:
+                        digest = hashlib.sha1(source).hexdigest()
+                        class_name, signature, references, declarations = \
+                            analyze_source(JackTokenizer.scan_bytes(source))
+                    finally:
+                        if isinstance(source, mmap.mmap):
+                            source.close()
+            except (OSError, CompilationError) as error:
+                errors[input_path] = \
+                    f'{input_path}: {type(error).__name__}: {error}'
+                # its class no longer exists as last scanned
+                self.forget_source(input_path)
+                continue
+            self.index.add_declarations(declarations)
+            self.sources[input_path] = {
+                "hash": digest,
+                "class": class_name,
+                "references": references,
+                "stamp": stamp,
+            }
+            self.signatures[class_name] = signature
+        return errors
+
+    def forget_missing(self, input_paths: typing.List[str]) -> None:
+        """Forgets the sources outside the given ones that no longer exist."""
+        directory = os.path.dirname(self.manifest_path)
+        scanned = set(input_paths)
+        for input_path in [
+                os.path.join(directory, key) for key in self.units] + [
+                input_path for input_path in self.sources]:
+            if input_path not in scanned and not os.path.exists(input_path):
+                self.forget_source(input_path)
+
+    def forget_source(self, input_path: str) -> None:
+        """Forgets everything scanned or recorded about a source. Its class is
+        removed from the signatures and the index unless another source
+        still declares it.
+        """
+        self.units.pop(self.key(input_path), None)
+        source = self.sources.pop(input_path, None)
+        if source is None or any(other["class"] == source["class"]
+                                 for other in self.sources.values()):
+            return
+        self.signatures.pop(source["class"], None)
+        self.index.remove(source["class"])
+
+    def entry(self, input_path: str) -> dict:
+        """
+        Args:
+            input_path (str): path of a scanned ".jack" file.
+
+        Returns:
+            dict: the manifest entry describing the unit's current inputs.
+        """
+        source = self.sources[input_path]
+        dependencies = {
+            name: self.signatures.get(name)
+            for name in source["references"] if name != source["class"]}
+        return {"hash": source["hash"], "dependencies": dependencies}
+
+    def is_fresh(self, input_path: str) -> bool:
+        """Checks whether a unit can be skipped.
+
+        Args:
+            input_path (str): path of a scanned ".jack" file.
+
+        Returns:
+            bool: True if the unit's output is up to date.
+        """
+        output_path = os.path.splitext(input_path)[0] + self.output_extension
+        return self.units.get(self.key(input_path)) == \
+            self.entry(input_path) and os.path.exists(output_path)
+
+    def record(self, input_path: str) -> None:
+        """Marks a unit as successfully compiled from its current inputs."""
+        self.units[self.key(input_path)] = self.entry(input_path)
+
+    def forget(self, input_path: str) -> None:
+        """Marks a unit as needing recompilation on the next run."""
+        self.units.pop(self.key(input_path), None)
+
+    def save(self) -> None:
+        """Atomically writes the manifest back to disk."""
+        manifest = {"version": self.version, "settings": self.settings,
+                    "units": self.units}
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def key(self, input_path: str) -> str:
+        return os.path.relpath(input_path, os.path.dirname(self.manifest_path))
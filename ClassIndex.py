@@ -0,0 +1,255 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import mmap
+import typing
+from JackTokenizer import JackTokenizer, CLASS_VAR_KEYWORDS, \
+    SUBROUTINE_KEYWORDS
+
+# the subroutines of the Jack OS, as (kind, return type, number of
+# parameters), used for the classes that are not part of the program
+OS_SUBROUTINES = {
+    "Math": {
+        "init": ("function", "void", 0),
+        "abs": ("function", "int", 1),
+        "multiply": ("function", "int", 2),
+        "divide": ("function", "int", 2),
+        "min": ("function", "int", 2),
+        "max": ("function", "int", 2),
+        "sqrt": ("function", "int", 1),
+    },
+    "String": {
+        "new": ("constructor", "String", 1),
+        "dispose": ("method", "void", 0),
+        "length": ("method", "int", 0),
+        "charAt": ("method", "char", 1),
+        "setCharAt": ("method", "void", 2),
+        "appendChar": ("method", "String", 1),
+        "eraseLastChar": ("method", "void", 0),
+        "intValue": ("method", "int", 0),
+        "setInt": ("method", "void", 1),
+        "backSpace": ("function", "char", 0),
+        "doubleQuote": ("function", "char", 0),
+        "newLine": ("function", "char", 0),
+    },
+    "Array": {
+        "new": ("function", "Array", 1),
+        "dispose": ("method", "void", 0),
+    },
+    "Output": {
+        "init": ("function", "void", 0),
+        "moveCursor": ("function", "void", 2),
+        "printChar": ("function", "void", 1),
+        "printString": ("function", "void", 1),
+        "printInt": ("function", "void", 1),
+        "println": ("function", "void", 0),
+        "backSpace": ("function", "void", 0),
+    },
+    "Screen": {
+        "init": ("function", "void", 0),
+        "clearScreen": ("function", "void", 0),
+        "setColor": ("function", "void", 1),
+        "drawPixel": ("function", "void", 2),
+        "drawLine": ("function", "void", 4),
+        "drawRectangle": ("function", "void", 4),
+        "drawCircle": ("function", "void", 3),
+    },
+    "Keyboard": {
+        "init": ("function", "void", 0),
+        "keyPressed": ("function", "char", 0),
+        "readChar": ("function", "char", 0),
+        "readLine": ("function", "String", 1),
+        "readInt": ("function", "int", 1),
+    },
+    "Memory": {
+        "init": ("function", "void", 0),
+        "peek": ("function", "int", 1),
+        "poke": ("function", "void", 2),
+        "alloc": ("function", "Array", 1),
+        "deAlloc": ("function", "void", 1),
+    },
+    "Sys": {
+        "init": ("function", "void", 0),
+        "halt": ("function", "void", 0),
+        "error": ("function", "void", 1),
+        "wait": ("function", "void", 1),
+    },
+}
+
+
+def scan_declarations(lexemes: typing.Iterable[typing.Tuple[str, str]]
+                      ) -> typing.Iterator[str]:
+    """Keeps the lexemes a ClassIndex needs from those of a class: "class"
+    and the class name, and every class variable declaration and subroutine
+    header up to its ";" or "{".
+
+    Args:
+        lexemes (typing.Iterable[typing.Tuple[str, str]]): the (group,
+        lexeme) pairs of JackTokenizer.scan() or scan_bytes().
+
+    Returns:
+        typing.Iterator[str]: the declaration lexemes.
+    """
+    in_declaration = False
+    class_name_follows = False
+    for group, lexeme in lexemes:
+        if group == "stringConstant":
+            continue
+        if class_name_follows or lexeme == "class":
+            class_name_follows = lexeme == "class"
+            yield lexeme
+            continue
+        if lexeme in SUBROUTINE_KEYWORDS or lexeme in CLASS_VAR_KEYWORDS:
+            in_declaration = True
+        if in_declaration:
+            if lexeme in ("{", ";"):
+                in_declaration = False
+            yield lexeme
+
+
+class SubroutineSignature:
+    """The kind, return type and number of declared parameters (not counting
+    the implicit "this" of methods) of a subroutine.
+    """
+    __slots__ = ('kind', 'return_type', 'arity')
+
+    def __init__(self, kind: str, return_type: str, arity: int) -> None:
+        self.kind = kind
+        self.return_type = return_type
+        self.arity = arity
+
+
+class ClassSignature:
+    """The field count and the subroutine signatures of a class."""
+    __slots__ = ('name', 'field_count', 'subroutines')
+
+    def __init__(self, name: str, field_count: int = 0) -> None:
+        self.name = name
+        self.field_count = field_count
+        self.subroutines: typing.Dict[str, SubroutineSignature] = {}
+
+
+class ClassIndex:
+    """The signatures of every class of a program, gathered by a pre-pass over
+    the declarations of all its sources, so that each compilation unit can
+    resolve and check the calls it makes to the others. The Jack OS classes
+    are known from the start, and a program class of the same name replaces
+    them.
+    """
+
+    def __init__(self) -> None:
+        """Creates an index of the Jack OS classes."""
+        self.classes: typing.Dict[str, ClassSignature] = {
+            class_name: self.os_signature(class_name)
+            for class_name in OS_SUBROUTINES}
+
+    @staticmethod
+    def os_signature(class_name: str) -> ClassSignature:
+        """
+        Args:
+            class_name (str): the name of a Jack OS class.
+
+        Returns:
+            ClassSignature: the signature of the standard OS class.
+        """
+        signature = ClassSignature(class_name)
+        for name, (kind, return_type, arity) in \
+                OS_SUBROUTINES[class_name].items():
+            signature.subroutines[name] = SubroutineSignature(
+                kind, return_type, arity)
+        return signature
+
+    def remove(self, class_name: str) -> None:
+        """Forgets a program class, such as one whose source was deleted. The
+        OS class of the same name, if there is one, is known again.
+        """
+        if class_name in OS_SUBROUTINES:
+            self.classes[class_name] = self.os_signature(class_name)
+        else:
+            self.classes.pop(class_name, None)
+
+    def add_source(self, text: typing.Union[str, bytes]
+                   ) -> typing.Optional[ClassSignature]:
+        """Indexes the declarations of a class, without compiling it.
+
+        Args:
+            text (typing.Union[str, bytes]): the source of a single Jack
+            class, as text or as its encoded bytes.
+
+        Returns:
+            typing.Optional[ClassSignature]: the signature of the class, or
+            None if the source does not declare one.
+        """
+        scan = JackTokenizer.scan if isinstance(text, str) \
+            else JackTokenizer.scan_bytes
+        return self.add_declarations(scan_declarations(scan(text)))
+
+    def add_declarations(self, declarations: typing.Iterable[str]
+                         ) -> typing.Optional[ClassSignature]:
+        """Indexes a class from its declaration lexemes.
+
+        Args:
+            declarations (typing.Iterable[str]): the lexemes kept by
+            scan_declarations().
+
+        Returns:
+            typing.Optional[ClassSignature]: the signature of the class, or
+            None if there is no class declaration.
+        """
+        lexemes = list(declarations)
+        if "class" not in lexemes[:-1]:
+            return None
+        signature = ClassSignature(lexemes[lexemes.index("class") + 1])
+        try:
+            for position, lexeme in enumerate(lexemes):
+                if lexeme == "field":
+                    # field type name (, name)* ;
+                    end = lexemes.index(";", position)
+                    signature.field_count += \
+                        lexemes[position:end].count(",") + 1
+                elif lexeme in SUBROUTINE_KEYWORDS:
+                    # kind type name ( (type name (, type name)*)? )
+                    end = lexemes.index(")", position)
+                    parameters = lexemes[position + 4:end]
+                    signature.subroutines[lexemes[position + 2]] = \
+                        SubroutineSignature(lexeme, lexemes[position + 1],
+                                            parameters.count(",") + 1
+                                            if parameters else 0)
+        except (ValueError, IndexError):
+            # a truncated declaration, which compiling the class reports
+            pass
+        self.classes[signature.name] = signature
+        return signature
+
+    def add_paths(self, input_paths: typing.Iterable[str]) -> None:
+        """Indexes the classes of the given ".jack" files."""
+        for input_path in input_paths:
+            with open(input_path, 'rb') as input_file:
+                source = JackTokenizer.map_source(input_file)
+                try:
+                    self.add_declarations(scan_declarations(
+                        JackTokenizer.scan_bytes(source)))
+                finally:
+                    if isinstance(source, mmap.mmap):
+                        source.close()
+
+    def __contains__(self, class_name: str) -> bool:
+        return class_name in self.classes
+
+    def lookup(self, class_name: str, subroutine: str
+               ) -> typing.Optional[SubroutineSignature]:
+        """
+        Args:
+            class_name (str): the name of a class.
+            subroutine (str): the name of one of its subroutines.
+
+        Returns:
+            typing.Optional[SubroutineSignature]: the signature of the
+            subroutine, or None if the class or the subroutine is unknown.
+        """
+        signature = self.classes.get(class_name)
+        return signature.subroutines.get(subroutine) if signature else None
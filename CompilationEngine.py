@@ -9,73 +9,220 @@ import typing
 import JackTokenizer
 import SymbolTable
 import VMWriter
-from JackTokenizer import Token
+from BinaryVMWriter import BinaryVMWriter
+from ClassIndex import ClassIndex
+from ControlFlowOptimizer import ControlFlowOptimizer
+from IntermediateCode import Pass, Subroutine
+from JackTokenizer import CompilationError, Token, TokenKind
+from LocalAllocator import LocalAllocator
+from PeepholeOptimizer import PeepholeOptimizer
 
+# names of the optional optimizations, all enabled by "-O"
+OPTIMIZATIONS = ['peephole', 'fold', 'shift', 'locals', 'cfg']
+# names of the optimizations that only apply when asked for by name: "pool"
+# shares one String object between all uses of the same literal in a class,
+# so mutating or disposing a literal affects its other uses, while "inline"
+# substitutes small subroutines at their call sites in other classes (see
+# Inliner) and "dce" drops the subroutines Main.main cannot reach (see
+# DeadCodeEliminator), so with either of them any change recompiles
+# everything, and with "dce" the output no longer serves as a library
+OPT_IN_OPTIMIZATIONS = ['pool', 'inline', 'dce']
+# the optimizations that rewrite the compiled files of the whole program
+WHOLE_PROGRAM_OPTIMIZATIONS = frozenset(['inline', 'dce'])
+# the writer of each output format
+OUTPUT_FORMATS = {'text': VMWriter.VMWriter, 'binary': BinaryVMWriter}
+# the function generated in a class to build its pooled string literals. A
+# ':' is legal in VM function names but not in Jack identifiers, so it cannot
+# clash with a subroutine of the class
+STRING_POOL_FUNCTION = 'strings:pool'
+KEYWORD_VALUES = {'true': -1, 'false': 0, 'null': 0}
+KIND_SEGMENTS = {'VAR': 'local', 'ARG': 'argument', 'STATIC': 'static',
+                 'FIELD': 'this'}
+# the current token once the input is exhausted, which matches no production,
+# so that a truncated class is reported rather than read past its end
+END_OF_FILE = Token('', TokenKind.SYMBOL)
 
-class CompilationError(BaseException):
-    pass
+
+def create_passes(optimizations: typing.Collection[str]) -> typing.List[Pass]:
+    """
+    Args:
+        optimizations (typing.Collection[str]): names of the enabled
+        optimizations.
+
+    Returns:
+        typing.List[Pass]: the passes the writer runs over every subroutine,
+        in order. The control flow is rebuilt first, so that the others see
+        its final shape, and locals are packed before the peephole pass, so
+        that the copies it turns into no-ops are left for it.
+    """
+    passes: typing.List[Pass] = []
+    if "cfg" in optimizations:
+        passes.append(ControlFlowOptimizer().optimize)
+    if "locals" in optimizations:
+        passes.append(LocalAllocator().allocate)
+    if "peephole" in optimizations:
+        passes.append(PeepholeOptimizer().optimize)
+    return passes
+
+
+def to_word(value: int) -> int:
+    """Wraps an integer around to a signed 16-bit word, like the Hack ALU."""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+def fold_unary(op: str, value: int) -> int:
+    """Evaluates a unary operator over a constant word at compile time.
+
+    Args:
+        op (str): the operator symbol.
+        value (int): the operand, as a signed 16-bit word.
+
+    Returns:
+        int: the resulting word.
+    """
+    if op == '-':
+        return to_word(-value)
+    elif op == '^':
+        return to_word(value << 1)
+    elif op == '#':
+        return value >> 1
+    return ~value
+
+
+def power_of_two(value: typing.Optional[int]) -> typing.Optional[int]:
+    """
+    Returns:
+        typing.Optional[int]: k if the value is a constant 2^k, else None.
+    """
+    if value is None or value <= 0 or value & (value - 1):
+        return None
+    return value.bit_length() - 1
+
+
+def fold_constant(op: str, left: int, right: int) -> typing.Optional[int]:
+    """Evaluates a binary operator over two constant words at compile time.
+
+    Args:
+        op (str): the operator symbol.
+        left (int): the left operand, as a signed 16-bit word.
+        right (int): the right operand, as a signed 16-bit word.
+
+    Returns:
+        typing.Optional[int]: the resulting word, or None if the operation
+        must be left to run time (e.g. a division by zero).
+    """
+    if op == '+':
+        return to_word(left + right)
+    elif op == '-':
+        return to_word(left - right)
+    elif op == '*':
+        return to_word(left * right)
+    elif op == '/':
+        if right == 0:
+            return None
+        quotient = abs(left) // abs(right)  # Math.divide truncates to zero
+        return to_word(-quotient if (left < 0) != (right < 0) else quotient)
+    elif op == '&':
+        return left & right
+    elif op == '|':
+        return left | right
+    elif op == '<':
+        return -1 if left < right else 0
+    elif op == '>':
+        return -1 if left > right else 0
+    elif op == '=':
+        return -1 if left == right else 0
+    return None
 
 
 class CompilationEngine:
     """Gets input from a JackTokenizer and emits its parsed structure into an
     output stream.
-    """
-    COUNTER = 0
 
-    def __init__(self, input_stream: JackTokenizer, output_stream) -> None:
+    Every compile_xxx() routine starts on the first token of its construct and
+    leaves the token that follows it as the current token. Productions are
+    chosen through dispatch tables keyed by token kind or text, and the bodies
+    of nested if and while statements are compiled by a single loop in
+    compile_statements() rather than by recursion.
+    """
+    def __init__(self, input_stream: JackTokenizer, output_stream,
+                 optimizations: typing.Collection[str] = (),
+                 index: typing.Optional[ClassIndex] = None,
+                 output_format: str = 'text') -> None:
         """
         Creates a new compilation engine with the given input and output. The
         next routine called must be compileClass()
         :param input_stream: The input stream.
         :param output_stream: The output stream.
+        :param optimizations: The names of the optimizations to apply.
+        :param index: The signatures of the program's classes, used to resolve
+        and check calls. Without it, unqualified calls are compiled as method
+        calls and no call is checked.
+        :param output_format: The encoding of the output, one of
+        OUTPUT_FORMATS. "binary" needs a binary output stream.
         """
+        self.optimizations = frozenset(optimizations)
+        # constant terms are held back (see compile_term) whenever an
+        # optimization can make use of their values
+        self.defer_constants = not self.optimizations.isdisjoint(
+            ["fold", "shift"])
         self.output_stream = output_stream
         self.tokenizer = input_stream
-        self.cur_token = next(self.tokenizer.token_generator())
-        self.next_token()
+        self.next_token()  # class
+        self.next_token()  # class name
         self.class_name = self.cur_token.text
-        if self.cur_token.type == "identifier":
-            JackTokenizer.CLASS_NAMES.append(self.class_name)
-            self.cur_token.set_type("symbol")
+        self.index = index
         self.table = SymbolTable.SymbolTable()
         self.cur_func = None
-        self.writer = VMWriter.VMWriter(output_stream)
+        self.subroutine_kind = None
+        self.writer = OUTPUT_FORMATS[output_format](
+            output_stream, passes=create_passes(self.optimizations))
+        # numbers the labels of this compilation unit
+        self.label_counter = 0
+        # the instructions of the subroutine being compiled
+        self.code: typing.Optional[Subroutine] = None
+        # the pending ends of the if and while statements being compiled
+        self.closers: typing.List[typing.Callable[[], None]] = []
+        self.statement_handlers = {
+            "let": self.compile_let,
+            "do": self.compile_do,
+            "if": self.compile_if,
+            "while": self.compile_while,
+            "return": self.compile_return,
+        }
+        self.term_handlers = {
+            TokenKind.INT_CONST: self.compile_integer_constant,
+            TokenKind.STRING_CONST: self.compile_string_constant,
+            TokenKind.KEYWORD: self.compile_keyword_constant,
+            TokenKind.IDENTIFIER: self.compile_name_term,
+            TokenKind.SYMBOL: self.compile_symbol_term,
+        }
+        self.symbol_term_handlers = dict.fromkeys(
+            JackTokenizer.UNARY_OPERATORS, self.compile_unary_term)
+        self.symbol_term_handlers["("] = self.compile_parenthesized_term
+        # the static slot holding each pooled string literal, by its text
+        self.string_pool: typing.Optional[typing.Dict[str, int]] = {} \
+            if "pool" in self.optimizations else None
+        self.uses_pool = False
 
     def compile_class(self) -> None:
-        # """Compiles a complete class."""
-        # class
+        """Compiles a complete class."""
         self.next_token()  # {
-        self.next_token() # kind
-        self.compile_class_var_dec()
-        self.next_token()  # }
+        self.consume("{")
+        while self.cur_token.text in JackTokenizer.CLASS_VAR_KEYWORDS:
+            self.compile_class_var_dec()
+        while self.cur_token.text in JackTokenizer.SUBROUTINE_KEYWORDS:
+            self.compile_subroutine()
+        self.consume("}")
+        if self.string_pool:
+            self.write_string_pool()
+        self.writer.flush()
 
     def compile_class_var_dec(self) -> None:
         """Compiles a static declaration or a field declaration."""
-        if self.cur_token.text not in ["static", "field"]:  # if there are no fields at the beginning of class
-            self.compile_subroutine()
-            return
-
-        kind = self.cur_token.text
-        self.next_token() # type
-        type = self.cur_token.text
-        if self.cur_token.type == "identifier":
-            JackTokenizer.CLASS_NAMES.append(type)
-            self.cur_token.set_type("symbol")
-        self.next_token()  # name
-        name = self.cur_token.text
-
-        self.table.define(name, type, kind)
-        self.next_token()  # ;/,
-
-        while self.cur_token.text == ",":
-            self.next_token()  # name
-            name = self.cur_token.text
-            self.table.define(name, type, kind)
-            self.next_token()  # ,\ ;
-        self.next_token() # kind/ function/ method /constructor /
-        if self.cur_token.text in ["static", "field"]:
-            self.compile_class_var_dec()
-        self.compile_subroutine()
+        kind = self.cur_token.text.upper()
+        self.next_token()  # type
+        self.compile_var_names(kind)
 
     def compile_subroutine(self) -> None:
         """
@@ -84,187 +231,274 @@ class CompilationEngine:
         you will understand why this is necessary in project 11.
         """
         self.table.start_subroutine()
-        if not self.cur_token or self.cur_token.text not in ["constructor", "function", "method"]:
-            return
-        while self.cur_token.text in ["constructor", "function", "method"]:  # compile all function in class
-            self.next_token()  # return type
-            if self.cur_token.type == "identifier":
-                JackTokenizer.CLASS_NAMES.append(self.cur_token.text)
-                self.cur_token.set_type("symbol")
-            self.next_token() #function name
-            self.cur_func = self.cur_token.text
-            self.next_token() # (
-            n_args = self.compile_parameter_list()
-            self.writer.write_function(f'{self.class_name}.{self.cur_func}', n_args)
-            # subroutine body
-            self.next_token()  # {
-            self.next_token()  # var / let / do / if / while / return
-            while self.cur_token.text != "}":
-                if self.cur_token.text == "var":
-                    self.compile_var_dec()
-                elif self.cur_token.text in ["let", "do", "if", "while", "return"]:
-                    self.compile_statements()
-            self.next_token()   # function/method/constructor
+        self.subroutine_kind = subroutine_kind = self.cur_token.text
+        self.next_token()  # return type
+        self.compile_type()
+        self.cur_func = self.cur_token.text
+        self.next_token()  # (
+        if subroutine_kind == "method":
+            self.table.define("this", self.class_name, "ARG")
+        self.consume("(")
+        self.compile_parameter_list()
+        self.consume(")")
+        self.consume("{")
+        while self.cur_token.text == "var":
+            self.compile_var_dec()
+        self.code = Subroutine(f'{self.class_name}.{self.cur_func}',
+                               self.table.var_count("VAR"))
+        if subroutine_kind == "constructor":
+            self.code.write_push("constant", self.table.var_count("FIELD"))
+            self.code.write_call("Memory.alloc", 1)
+            self.code.write_pop("pointer", 0)
+        elif subroutine_kind == "method":
+            self.code.write_push("argument", 0)
+            self.code.write_pop("pointer", 0)
+        body = self.code.mark()
+        self.uses_pool = False
+        self.compile_statements()
+        self.consume("}")
+        if self.uses_pool:
+            self.code.insert(body, self.write_pool_guard)
+        self.writer.write_subroutine(self.code)
+
+    def write_pool_guard(self) -> None:
+        """Writes the commands that build the class's pooled strings unless
+        they were built already, which the slot of the first one tells.
+        """
+        built = self.new_label()
+        self.code.write_push("static", min(self.string_pool.values()))
+        self.code.write_if(built)
+        self.code.write_call(f'{self.class_name}.{STRING_POOL_FUNCTION}', 0)
+        self.code.write_pop("temp", 0)
+        self.code.write_label(built)
+
+    def write_string_pool(self) -> None:
+        """Writes the function that builds every pooled string of the class
+        into its static slot.
+        """
+        self.code = Subroutine(f'{self.class_name}.{STRING_POOL_FUNCTION}')
+        for text, index in self.string_pool.items():
+            self.write_string(text)
+            self.code.write_pop("static", index)
+        self.code.write_push("constant", 0)
+        self.code.write_return()
+        self.writer.write_subroutine(self.code)
 
     def compile_parameter_list(self) -> int:
         """Compiles a (possibly empty) parameter list, not including the 
         enclosing "()".
         """
         args_counter = 0
-        self.next_token()  # first arg type / )
         if self.cur_token.text == ")":  # if no parameters in the list
             return args_counter
-        # add args to symbol table:
-        kind = "ARG"
-        type = self.cur_token.text
-        if self.cur_token.type == "identifier":
-            JackTokenizer.CLASS_NAMES.append(type)
-            self.cur_token.set_type("symbol")
-        self.next_token() # name
-        name = self.cur_token.text
-        self.table.define(name, type, kind)
-        self.writer.write_push("argument", self.table.index_of(name))
-        args_counter += 1
-
-        self.next_token()  # , or )
-        while self.cur_token.text == ",":
-            self.next_token()  # name
-            name = self.cur_token.text
-            self.table.define(name, type, kind)
-            self.writer.write_push("argument", self.table.index_of(name))
+        while True:
+            type = self.compile_type()
+            self.table.define(self.cur_token.text, type, "ARG")
+            self.next_token()  # , or )
             args_counter += 1
-
-        return args_counter
+            if self.cur_token.text != ",":
+                return args_counter
+            self.next_token()  # type
 
     def compile_var_dec(self) -> None:
         """Compiles a var declaration."""
-        kind = "VAR"
-        self.next_token()
-        type = self.cur_token.text
-        if self.cur_token.type == "identifier":
-            JackTokenizer.CLASS_NAMES.append(type)
-            self.cur_token.set_type("symbol")
-        self.next_token()
-        name = self.cur_token.text
-        self.table.define(name, type, kind)
-        self.next_token() # ,\;
+        self.next_token()  # type
+        self.compile_var_names("VAR")
+
+    def compile_var_names(self, kind: str) -> None:
+        """Compiles "type varName (',' varName)* ';'" and defines every name
+        with the given kind.
+        """
+        type = self.compile_type()
+        self.table.define(self.cur_token.text, type, kind)
+        self.next_token()  # , or ;
         while self.cur_token.text == ",":
-            self.next_token()
-            name = self.cur_token.text
-            self.table.define(name, type, kind)
-            self.next_token()
+            self.next_token()  # name
+            self.table.define(self.cur_token.text, type, kind)
+            self.next_token()  # , or ;
+        self.consume(";")
+
+    def compile_type(self) -> str:
+        """Compiles a type."""
+        type = self.cur_token.text
         self.next_token()
+        return type
 
     def compile_statements(self) -> None:
         """Compiles a sequence of statements, not including the enclosing
         "{}".
-        when return from statement compilation cur_token should be ;!!!!!!!!!!!!!!!!!!
+        The bodies of nested if and while statements are compiled by this
+        same loop: their handlers leave a closer on self.closers, which is
+        called once the "}" ending the body is reached.
         """
-        while self.cur_token.text in ["let", "do", "if", "while", "return"]:
-            if self.cur_token.text == "let":
-                self.compile_let()
-            elif self.cur_token.text == "do":
-                self.compile_do()
-            elif self.cur_token.text == "if":
-                self.compile_if()
-            elif self.cur_token.text == "while":
-                self.compile_while()
-            elif self.cur_token.text == "return":
-                self.compile_return()
-            self.next_token()  # do\if\....
-
+        depth = len(self.closers)
+        while True:
+            token = self.cur_token
+            handler = self.statement_handlers.get(token.text) \
+                if token.kind is TokenKind.KEYWORD else None
+            if handler is not None:
+                handler()
+            elif len(self.closers) > depth and token.text == "}":
+                self.next_token()
+                self.closers.pop()()
+            else:
+                return
 
     def compile_do(self) -> None:
         """Compiles a do statement."""
-        self.next_token()  # class /name
+        self.next_token()  # class / object / subroutine name
         name = self.cur_token.text
-        self.next_token()  # ./(
-        if self.cur_token and self.cur_token.text == ".":
-            name += "."
-            self.next_token()  # subroutine name
-            name += self.cur_token.text
-            self.next_token()  # (
-
-        n_args: int = self.compile_expression_list()
-        self.next_token()  # ;
-        self.writer.write_call(name, n_args)
+        self.next_token()  # . / (
+        self.compile_subroutine_call(name)
+        self.consume(";")
+        self.code.write_pop("temp", 0)  # discard the returned value
 
     def compile_let(self) -> None:
         """Compiles a let statement."""
         self.next_token()  # name
         name = self.cur_token.text  # variable name
         self.next_token()  # [ / =
-        if self.cur_token and self.cur_token.text == "[":
-            self.writer.write_push(self.table.kind_of(name), self.table.index_of(name))
-            self.next_token() # [
+        if self.cur_token.text == "[":
             self.next_token()  # expression
             self.compile_expression()
-            self.next_token()  # ]
-            self.next_token()  # =
+            self.consume("]")
+            self.write_push_variable(name)
+            self.code.write_arithmetic("add")
+            self.consume("=")
             self.compile_expression()
-            self.writer.write_pop("temp", 0)
-            self.writer.write_pop("pointer", 1)
-            self.writer.write_push("temp", 0)
-            self.writer.write_pop("that", 0)
-        self.next_token()
+            self.consume(";")
+            self.code.write_pop("temp", 0)
+            self.code.write_pop("pointer", 1)
+            self.code.write_push("temp", 0)
+            self.code.write_pop("that", 0)
+            return
+        self.consume("=")
         self.compile_expression()
-        self.writer.write_pop(self.table.kind_of(name), self.table.index_of(name))  # pop the first value in the stuck
+        self.consume(";")
+        self.write_pop_variable(name)
 
     def compile_while(self) -> None:
         """Compiles a while statement."""
-        self.writer.write_label(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER}')  # back to while label
-        self.next_token()  # while
+        top, end = self.new_label(), self.new_label()
+        self.code.write_label(top)  # back to while label
         self.next_token()  # (
+        self.consume("(")
         self.compile_expression()
-        self.next_token()  # )
-        self.writer.write_arithmetic("~")  # if not expression
-        self.writer.write_if(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER+1}')  # out of the while label
-        self.next_token()  # {
-        self.compile_statements()  # not sure cus statments can be here function calls as well
-        self.writer.write_goto(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER+1}')
-        self.writer.write_label(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER}')
-        CompilationEngine.COUNTER+=2
+        self.consume(")")
+        self.consume("{")
+        self.code.write_arithmetic("~")  # if not expression
+        self.code.write_if(end)  # out of the while label
+        self.closers.append(lambda: self.close_while(top, end))
+
+    def close_while(self, top: str, end: str) -> None:
+        self.code.write_goto(top)
+        self.code.write_label(end)
 
     def compile_return(self) -> None:
         """Compiles a return statement."""
-        self.next_token()  # name/;
-        if self.cur_token.text == ";":
-            self.writer.write_push("constant", 0)  # returning void
+        self.next_token()  # expression / ;
+        if self.at_symbol(";"):
+            self.code.write_push("constant", 0)  # returning void
         else:
             self.compile_expression()
-        self.writer.write_return()
+        self.consume(";")
+        self.code.write_return()
+
     def compile_if(self) -> None:
         """Compiles a if statement, possibly with a trailing else clause."""
+        otherwise = self.new_label()
         self.next_token()  # (
-        self.next_token() # name
+        self.consume("(")
         self.compile_expression()
-        self.next_token()  # {
-        self.writer.write_arithmetic("~")  # if not expression
-        self.writer.write_goto(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER}')  # go to label 1
-        self.next_token()
-        self.compile_statements()  # needs more than that
-        if self.cur_token and self.cur_token.text == "else":
-            self.writer.write_goto(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER+1}')  # go to label L2
-            self.writer.write_label(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER}')  # label L1
-            self.next_token() # else
-            self.next_token() # {
-            self.compile_statements()  # needs more than that
-            self.next_token()  # }
-            self.writer.write_label(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER+1}')  # label L2
+        self.consume(")")
+        self.consume("{")
+        self.code.write_arithmetic("~")  # if not expression
+        self.code.write_if(otherwise)  # go to label L1
+        self.closers.append(lambda: self.close_if(otherwise))
+
+    def close_if(self, otherwise: str) -> None:
+        if self.cur_token.text != "else":
+            self.code.write_label(otherwise)  # label L1 if no else
             return
-        self.writer.write_label(f'{self.cur_func}.{self.class_name}.{CompilationEngine.COUNTER}')  # label L1 if no else
+        end = self.new_label()
+        self.code.write_goto(end)  # go to label L2
+        self.code.write_label(otherwise)  # label L1
+        self.next_token()  # {
+        self.consume("{")
+        self.closers.append(lambda: self.code.write_label(end))  # label L2
 
     def compile_expression(self) -> None:
         """Compiles an expression."""
-        self.compile_term()
+        value = self.fold_expression()
+        if value is not None:
+            self.code.write_constant(value)
+
+    def fold_expression(self) -> typing.Optional[int]:
+        """Compiles an expression, except that when constant folding is on and
+        the expression is made only of constants, nothing is emitted and its
+        value is returned instead.
+        """
+        folding = "fold" in self.optimizations
+        reducing = "shift" in self.optimizations
+        value = self.compile_term()
         while self.cur_token.text in JackTokenizer.BINARY_OPERATORS:
             op = self.cur_token.text
             self.next_token()
-            self.compile_term()
-            self.writer.write_arithmetic(op)
+            mark = self.code.mark()
+            right = self.compile_term()
+            if folding and value is not None and right is not None:
+                folded = fold_constant(op, value, right)
+                if folded is not None:
+                    value = folded
+                    continue
+            if reducing and op in ('*', '/') and value is None and \
+                    power_of_two(right) is not None:
+                self.write_shift(op, power_of_two(right))
+                continue
+            if reducing and op == '*' and right is None and \
+                    power_of_two(value) is not None:
+                # the product commutes, so the held back 2^k is never pushed
+                self.write_shift(op, power_of_two(value))
+                value = None
+                continue
+            if value is not None:
+                # the left operand was held back in case it could be folded
+                self.code.insert_constant(mark, value)
+                value = None
+            if right is not None:
+                self.code.write_constant(right)
+            self.write_operator(op)
+        return value
+
+    def write_shift(self, op: str, k: int) -> None:
+        """Writes a multiplication or division of the value on top of the
+        stack by 2^k as shifts.
+        """
+        if op == '/' and k:
+            # shifting right rounds down, whereas Math.divide truncates
+            # towards zero, so a negative dividend is first biased by 2^k - 1
+            self.code.write_pop('temp', 1)
+            self.code.write_push('temp', 1)
+            self.code.write_push('temp', 1)
+            self.code.write_push('constant', 0)
+            self.code.write_arithmetic('<')
+            self.code.write_push('constant', (1 << k) - 1)
+            self.code.write_arithmetic('&')
+            self.code.write_arithmetic('+')
+        for _ in range(k):
+            self.code.write_arithmetic('^' if op == '*' else '#')
 
-    def compile_term(self) -> None:
-        """Compiles a term.
+    def write_operator(self, op: str) -> None:
+        if op == '*':
+            self.code.write_call('Math.multiply', 2)
+        elif op == '/':
+            self.code.write_call('Math.divide', 2)
+        else:
+            self.code.write_arithmetic(op)
+
+    def compile_term(self) -> typing.Optional[int]:
+        """Compiles a term. When constant folding or strength reduction is on,
+        a constant term is not emitted and its value is returned instead.
         This routine is faced with a slight difficulty when
         trying to decide between some of the alternative parsing rules.
         Specifically, if the current token is an identifier, the routing must
@@ -273,98 +507,206 @@ class CompilationEngine:
         to distinguish between the three possibilities. Any other token is not
         part of this term and should not be advanced over.
         """
+        return self.term_handlers[self.cur_token.kind]()
 
-        if self.cur_token.text == "(":
-            self.next_token()
+    def compile_integer_constant(self) -> typing.Optional[int]:
+        value = self.cur_token.text
+        self.next_token()
+        if self.defer_constants:
+            return to_word(value)
+        self.code.write_push("constant", value)
+        return None
+
+    def compile_string_constant(self) -> None:
+        text = self.cur_token.text
+        if self.string_pool is None:
+            self.write_string(text)
+        else:
+            if text not in self.string_pool:
+                # quotes cannot start a variable name, so the slot is hidden
+                self.table.define(f'"{text}"', "String", "STATIC")
+                self.string_pool[text] = self.table.lookup(f'"{text}"').index
+            self.code.write_push("static", self.string_pool[text])
+            self.uses_pool = True
+        self.next_token()
+
+    def write_string(self, text: str) -> None:
+        """Writes the commands that build a new string holding the text."""
+        self.code.write_push("constant", len(text))
+        self.code.write_call('String.new', 1)
+        for char in text:
+            self.code.write_push("constant", ord(char))
+            self.code.write_call('String.appendChar', 2)
+
+    def compile_keyword_constant(self) -> typing.Optional[int]:
+        keyword = self.cur_token.text
+        self.next_token()
+        if keyword == "this":
+            self.code.write_push("pointer", 0)
+            return None
+        if keyword not in KEYWORD_VALUES:
+            raise CompilationError(
+                f'{self.class_name}.{self.cur_func}: unexpected {keyword!r}')
+        if self.defer_constants:
+            return KEYWORD_VALUES[keyword]
+        self.code.write_push("constant", 0)
+        if keyword == "true":
+            self.code.write_arithmetic("~")
+        return None
+
+    def compile_name_term(self) -> None:
+        name = self.cur_token.text
+        self.next_token()
+        if self.cur_token.text == "[":
+            self.next_token()  # expression
             self.compile_expression()
-            self.next_token()
-        elif self.cur_token.type == "integerConstant":
-            self.writer.write_push("constant", int(self.cur_token.text))
-            self.next_token() #,/)
-        elif self.cur_token.type == "stringConstant":
-            self.writer.write_push("constant", len(self.cur_token.text))
-            self.writer.write_call('String.new', 1)
-            for char in self.cur_token.text:
-                self.writer.write_push("constant",ord(char))
-                self.writer.write_call('String.appendChar', 2)
-            self.next_token()
-        elif self.cur_token.text in ['true', 'false', 'null']:
-            self.writer.write_push("constant", 0)
-            if self.cur_token.text == 'true':
-                self.writer.write_arithmetic("~")
-            self.next_token()
-        elif self.cur_token.text == "this":
-            self.writer.write_push("pointer", 0)
-            self.next_token() #;
-        elif self.cur_token.type == "identifier":
-            name = self.cur_token.text
-            self.next_token()
-            if self.cur_token.text == '[':
-                self.next_token()
-                self.compile_expression()
-                self.writer.write_push(self.table.kind_of(name), self.table.index_of(name))
-                self.writer.write_arithmetic('add')
-                self.writer.write_pop('pointer', 1)
-                self.writer.write_push('that', 0)
-                self.next_token()  # ]
-            elif self.cur_token.text == '(':
-                self.next_token() # (
-                self.compile_expression_list()
-                self.next_token()  #  )
-            elif self.cur_token.text == '.':
-                if name not in self.table.table.index:
-                    JackTokenizer.CLASS_NAMES.append(name)
-                    self.compile_static_method_call(name)
-                    return
-                self.writer.write_push(self.table.kind_of(name), self.table.index_of(name))
-                self.next_token() # .
-                self.cur_func= self.cur_token.text
-                self.next_token()# function name
-                self.next_token() # (
-                n_args = self.compile_expression_list()
-                self.next_token() # )
-                self.writer.write_call(self.cur_func, n_args)
-            # elif self.cur_token.text in JackTokenizer.BINARY_OPERATORS:
-            #     self.writer.write_push(self.table.kind_of(name), self.table.index_of(name))
-            #     return
-            else:
-                self.writer.write_push(self.table.kind_of(name), self.table.index_of(name))
-                return
-            self.next_token()
-        elif self.cur_token.text in JackTokenizer.CLASS_NAMES:
-            class_name = self.cur_token.text
-            self.next_token()
-            self.compile_static_method_call(class_name)
-        elif self.cur_token.text in ['-', '~']:
-            op = self.cur_token.text
-            self.next_token()
-            self.compile_term()
-            self.writer.write_arithmetic(op)
+            self.consume("]")
+            self.write_push_variable(name)
+            self.code.write_arithmetic("add")
+            self.code.write_pop("pointer", 1)
+            self.code.write_push("that", 0)
+        elif self.cur_token.text in ("(", "."):
+            self.compile_subroutine_call(name)
+        else:
+            self.write_push_variable(name)
 
-    def compile_static_method_call(self,class_name):
-        self.next_token()  # function name
-        func = self.cur_token.text
-        self.next_token()  # (
+    def compile_symbol_term(self) -> typing.Optional[int]:
+        handler = self.symbol_term_handlers.get(self.cur_token.text)
+        if handler is not None:
+            return handler()
+        raise CompilationError(f'{self.class_name}.{self.cur_func}: '
+                               f'unexpected {self.found()}')
+
+    def compile_parenthesized_term(self) -> typing.Optional[int]:
+        self.next_token()  # expression
+        value = self.fold_expression()
+        self.consume(")")
+        return value
+
+    def compile_unary_term(self) -> typing.Optional[int]:
+        op = self.cur_token.text
+        self.next_token()
+        value = self.compile_term()
+        if value is not None:
+            return fold_unary(op, value)
+        self.code.write_arithmetic("neg" if op == '-' else op)
+        return None
+
+    def compile_subroutine_call(self, name: str) -> None:
+        """Compiles the rest of a subroutine call whose first name was already
+        consumed, from the "." or "(" that follows it.
+        """
+        if self.cur_token.text == ".":
+            self.next_token()  # subroutine name
+            subroutine = self.cur_token.text
+            self.next_token()  # (
+            symbol = self.table.lookup(name)
+            if symbol is not None:  # a method of the object held by name
+                self.code.write_push(KIND_SEGMENTS[symbol.kind],
+                                       symbol.index)
+                class_name, is_method = symbol.type, True
+            else:  # a function or constructor of the class name
+                class_name, is_method = name, False
+        else:  # a subroutine of this class, a method unless known otherwise
+            class_name, subroutine = self.class_name, name
+            signature = self.index.lookup(class_name, subroutine) \
+                if self.index is not None else None
+            is_method = signature is None or signature.kind == "method"
+            if signature is not None and is_method and \
+                    self.subroutine_kind == "function":
+                raise CompilationError(
+                    f'{self.class_name}.{self.cur_func}: method '
+                    f'{subroutine!r} called without an object')
+            if is_method:
+                self.code.write_push("pointer", 0)
+        self.consume("(")
         n_args = self.compile_expression_list()
-        self.next_token()  # ;
-        self.writer.write_call(f'{class_name}.{func}', n_args)
+        self.consume(")")
+        self.check_call(class_name, subroutine, is_method, n_args)
+        self.code.write_call(f'{class_name}.{subroutine}',
+                               n_args + is_method)
 
-    def next_token(self):
-        self.cur_token = next(self.tokenizer.token_generator())
+    def check_call(self, class_name: str, subroutine: str, is_method: bool,
+                   n_args: int) -> None:
+        """Checks a call against the index, if the class is indexed.
+
+        Args:
+            class_name (str): the class of the called subroutine.
+            subroutine (str): the name of the called subroutine.
+            is_method (bool): whether the call passes an object.
+            n_args (int): the number of arguments, not counting the object.
+        """
+        if self.index is None or class_name not in self.index:
+            return
+        where = f'{self.class_name}.{self.cur_func}'
+        signature = self.index.lookup(class_name, subroutine)
+        if signature is None:
+            raise CompilationError(f'{where}: {class_name} has no subroutine '
+                                   f'{subroutine!r}')
+        if is_method != (signature.kind == "method"):
+            raise CompilationError(f'{where}: {class_name}.{subroutine} is a '
+                                   f'{signature.kind}, but is called as a '
+                                   f'{"method" if is_method else "function"}')
+        if n_args != signature.arity:
+            raise CompilationError(f'{where}: {class_name}.{subroutine} takes '
+                                   f'{signature.arity} arguments, {n_args} '
+                                   f'given')
 
     def compile_expression_list(self) -> int:  # should count how many arguments are in the function
         """Compiles a (possibly empty) comma-separated list of expressions."""
-        n_args_counter = 0
-        self.next_token() #name
-        if self.cur_token.text == ")":
-            return n_args_counter
+        if self.at_symbol(")"):
+            return 0
         self.compile_expression()
-        n_args_counter += 1
+        n_args_counter = 1
         while self.cur_token.text == ",":
-            self.next_token()  # name
-            n_args_counter += 1
+            self.next_token()  # expression
             self.compile_expression()
+            n_args_counter += 1
         return n_args_counter
 
+    def lookup_variable(self, name: str) -> SymbolTable.Symbol:
+        symbol = self.table.lookup(name)
+        if symbol is None:
+            raise CompilationError(f'{self.class_name}.{self.cur_func}: '
+                                   f'undefined variable {name!r}')
+        return symbol
+
+    def write_push_variable(self, name: str) -> None:
+        symbol = self.lookup_variable(name)
+        self.code.write_push(KIND_SEGMENTS[symbol.kind], symbol.index)
+
+    def write_pop_variable(self, name: str) -> None:
+        symbol = self.lookup_variable(name)
+        self.code.write_pop(KIND_SEGMENTS[symbol.kind], symbol.index)
+
+    def new_label(self) -> str:
+        label = f'{self.cur_func}.{self.class_name}.{self.label_counter}'
+        self.label_counter += 1
+        return label
 
+    def at_symbol(self, text: str) -> bool:
+        """Checks the current token is the given symbol, and not a string
+        constant that happens to have the same text.
+        """
+        return self.cur_token.kind is TokenKind.SYMBOL and \
+            self.cur_token.text == text
+
+    def consume(self, text: str) -> None:
+        """Checks that the current token is the given symbol and advances
+        past it.
+        """
+        if not self.at_symbol(text):
+            raise CompilationError(f'{self.class_name}.{self.cur_func}: '
+                                   f'expected {text!r}, found {self.found()}')
+        self.next_token()
 
+    def found(self) -> str:
+        """
+        Returns:
+            str: a description of the current token for error messages.
+        """
+        return "end of file" if self.cur_token is END_OF_FILE \
+            else repr(self.cur_token.text)
+
+    def next_token(self):
+        self.cur_token = self.tokenizer.advance() or END_OF_FILE
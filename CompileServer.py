@@ -0,0 +1,273 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Keeps a compiler process resident, so that interpreter startup, imports and
+the build caches are paid for once rather than on every compilation.
+
+The server behind "JackCompiler --serve SOCKET" reads requests from a Unix
+stream socket, one JSON object per line, and answers each with one line:
+
+    {"path": "<.jack file or directory>", "force": false}
+    {"up_to_date": 3, "compiled": ["/abs/Main.jack"], "errors": {}}
+
+A request that cannot be served is answered with {"error": "<description>"}.
+"""
+import errno
+import json
+import os
+import select
+import socket
+import socketserver
+import stat
+import struct
+import time
+import typing
+
+# seconds between two scans of the watched directory when polling
+POLL_INTERVAL = 0.5
+# seconds to wait for further changes before rebuilding, since editors often
+# save a file through several writes and renames
+SETTLE_DELAY = 0.05
+# inotify events that mean a file's content may have changed
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCHED_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class DirectoryWatcher:
+    """Waits for the ".jack" files of a directory to change, through inotify
+    where it is available and by polling their modification times otherwise.
+    """
+
+    def __init__(self, directory: str,
+                 poll_interval: float = POLL_INTERVAL) -> None:
+        """
+        Args:
+            directory (str): the directory to watch.
+            poll_interval (float): seconds between scans when polling.
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.inotify_fd = self.open_inotify(directory)
+        self.snapshot = self.scan()
+
+    @staticmethod
+    def open_inotify(directory: str) -> typing.Optional[int]:
+        """
+        Returns:
+            typing.Optional[int]: an inotify descriptor watching the
+            directory, or None if inotify is not available.
+        """
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory),
+                                  WATCHED_EVENTS) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def scan(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        """
+        Returns:
+            typing.Dict[str, typing.Tuple[int, int]]: the modification time
+            and size of every ".jack" file in the directory, by name.
+        """
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(".jack") and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # removed since the directory was listed
+                        continue
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self) -> typing.Set[str]:
+        """Blocks until at least one ".jack" file was written, created,
+        renamed or removed.
+
+        Returns:
+            typing.Set[str]: the names of the changed files.
+        """
+        if self.inotify_fd is not None:
+            changed = self.read_events(None)
+            while True:
+                more = self.read_events(SETTLE_DELAY)
+                if not more:
+                    return changed
+                changed |= more
+        while True:
+            time.sleep(self.poll_interval)
+            snapshot = self.scan()
+            changed = {name for name in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(name) != self.snapshot.get(name)}
+            self.snapshot = snapshot
+            if changed:
+                return changed
+
+    def read_events(self, timeout: typing.Optional[float]) -> typing.Set[str]:
+        """
+        Args:
+            timeout (typing.Optional[float]): seconds to wait for events, or
+            None to wait until there are some.
+
+        Returns:
+            typing.Set[str]: the names of the ".jack" files in the events
+            read, which may be empty.
+        """
+        changed = set()
+        while not changed:
+            ready, _, _ = select.select([self.inotify_fd], [], [], timeout)
+            if not ready:
+                return changed
+            data = os.read(self.inotify_fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if name.lower().endswith(".jack"):
+                    changed.add(name)
+        return changed
+
+    def close(self) -> None:
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+
+def watch(directory: str, rebuild: typing.Callable[[], None],
+          poll_interval: float = POLL_INTERVAL) -> None:
+    """Calls rebuild() whenever the ".jack" files of a directory change,
+    until interrupted.
+
+    Args:
+        directory (str): the directory to watch.
+        rebuild (typing.Callable[[], None]): brings the build up to date.
+        poll_interval (float): seconds between scans when inotify is not
+        available.
+    """
+    watcher = DirectoryWatcher(directory, poll_interval)
+    try:
+        while True:
+            watcher.wait()
+            rebuild()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    """Serves the requests of one connection, one line at a time."""
+    server: "CompileServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict) or "path" not in request:
+                    raise ValueError('a request needs a "path"')
+                response = self.server.build(request)
+            except Exception as error:
+                response = {"error": f'{type(error).__name__}: {error}'}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """Answers compile requests over a Unix socket. Requests are served one
+    at a time, since they share the compiler's state and build caches.
+    """
+
+    def __init__(self, socket_path: str,
+                 build: typing.Callable[[dict], dict]) -> None:
+        """
+        Args:
+            socket_path (str): where to create the socket.
+            build (typing.Callable[[dict], dict]): serves a request.
+        """
+        self.build = build
+        super().__init__(socket_path, CompileRequestHandler)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """Removes the socket left behind by a server that is no longer running,
+    which refuses connections.
+
+    Raises:
+        FileExistsError: if the path is something other than a socket, or a
+        server still accepts connections on it.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "not a socket, refusing to "
+                              "replace it", socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise FileExistsError(errno.EEXIST, "a server is already listening on "
+                          "it", socket_path)
+
+
+def serve(socket_path: str, build: typing.Callable[[dict], dict]) -> None:
+    """Serves compile requests on a Unix socket until interrupted. A socket
+    left behind by a previous server is replaced, see remove_stale_socket().
+
+    Args:
+        socket_path (str): where to create the socket.
+        build (typing.Callable[[dict], dict]): serves a request.
+    """
+    remove_stale_socket(socket_path)
+    with CompileServer(socket_path, build) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def request(socket_path: str, path: str, force: bool = False) -> dict:
+    """Sends a single compile request to a running server.
+
+    Args:
+        socket_path (str): the server's socket.
+        path (str): the ".jack" file or directory to compile.
+        force (bool): recompile the files even if they are up to date.
+
+    Returns:
+        dict: the server's response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as stream:
+            stream.write(json.dumps({"path": os.path.abspath(path),
+                                     "force": force}).encode() + b"\n")
+            stream.flush()
+            return json.loads(stream.readline())
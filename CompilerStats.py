@@ -0,0 +1,227 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import cProfile
+import os
+import sys
+import time
+import typing
+from ClassIndex import ClassIndex
+from CompilationEngine import CompilationEngine
+from IntermediateCode import COMMAND_NAMES, Subroutine
+from JackTokenizer import JackTokenizer
+
+# VM commands reported together under the "arithmetic" category
+ARITHMETIC_COMMANDS = frozenset(['add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and',
+                                 'or', 'not', 'shiftleft', 'shiftright'])
+# suffixes of the --profile paths that receive collapsed stacks rather than
+# pstats data
+COLLAPSED_SUFFIXES = ('.folded', '.collapsed')
+
+
+def timed_production(name: str, production: typing.Callable
+                     ) -> typing.Callable:
+    """Wraps a compile_xxx() production so that its own running time, without
+    the nested productions and lexing, is added to the engine's stats.
+    """
+    def timed(engine, *args):
+        stats = engine.stats
+        outer_time = stats.nested_time
+        stats.nested_time = 0.0
+        start = time.perf_counter()
+        try:
+            return production(engine, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.add_production(name, elapsed - stats.nested_time)
+            stats.nested_time = outer_time + elapsed
+    return timed
+
+
+class InstrumentedEngine(CompilationEngine):
+    """A CompilationEngine whose productions are timed into self.stats. It is
+    only used when statistics are requested, so the plain engine pays nothing
+    for them.
+    """
+    stats: "CompilerStats"
+
+
+for _name in dir(CompilationEngine):
+    if _name.startswith("compile_"):
+        setattr(InstrumentedEngine, _name,
+                timed_production(_name, getattr(CompilationEngine, _name)))
+
+
+class CompilerStats:
+    """Counters describing where the compilation of one or more files went."""
+
+    def __init__(self, name: str = "total") -> None:
+        """
+        Args:
+            name (str): the name the counters are reported under.
+        """
+        self.name = name
+        self.lexing_time = 0.0
+        self.productions: typing.Dict[str, typing.List[float]] = {}
+        self.lookups = 0
+        self.instructions: typing.Dict[str, int] = collections.Counter()
+        self.bytes_written = 0
+        # time spent in the nested calls of the production being timed
+        self.nested_time = 0.0
+
+    def create_engine(self, tokenizer: JackTokenizer, output_stream,
+                      optimizations: typing.Collection[str] = (),
+                      index: typing.Optional[ClassIndex] = None,
+                      output_format: str = "text") -> CompilationEngine:
+        """Creates a compilation engine that records its work into these
+        counters.
+
+        Args:
+            tokenizer (JackTokenizer): the tokenizer of the compiled file.
+            output_stream: the stream the VM commands are written to.
+            optimizations (typing.Collection[str]): passed on to the engine.
+            index (ClassIndex): passed on to the engine.
+            output_format (str): passed on to the engine.
+
+        Returns:
+            CompilationEngine: the instrumented engine.
+        """
+        advance = tokenizer.advance
+
+        def timed_advance():
+            start = time.perf_counter()
+            token = advance()
+            elapsed = time.perf_counter() - start
+            self.lexing_time += elapsed
+            self.nested_time += elapsed
+            return token
+        tokenizer.advance = timed_advance
+        engine = InstrumentedEngine(tokenizer, output_stream, optimizations,
+                                    index, output_format)
+        engine.stats = self
+        lookup = engine.table.lookup
+
+        def counted_lookup(name):
+            self.lookups += 1
+            return lookup(name)
+        engine.table.lookup = counted_lookup
+        engine.writer.output_stream = CountingStream(
+            engine.writer.output_stream, self)
+        emit = engine.writer.emit
+
+        def counted_emit(subroutine):
+            self.count_subroutine(subroutine)
+            emit(subroutine)
+        engine.writer.emit = counted_emit
+        return engine
+
+    def add_production(self, name: str, seconds: float) -> None:
+        calls = self.productions.setdefault(name, [0, 0.0])
+        calls[0] += 1
+        calls[1] += seconds
+
+    def count_subroutine(self, subroutine: Subroutine) -> None:
+        """Counts the VM commands of a function as it is written."""
+        self.instructions["function"] += 1
+        for opcode, count in collections.Counter(subroutine.opcodes).items():
+            command = COMMAND_NAMES[opcode]
+            self.instructions["arithmetic" if command in ARITHMETIC_COMMANDS
+                              else command] += count
+
+    def merge(self, other: "CompilerStats") -> None:
+        """Adds another set of counters to these."""
+        self.lexing_time += other.lexing_time
+        for name, (calls, seconds) in other.productions.items():
+            totals = self.productions.setdefault(name, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        self.lookups += other.lookups
+        self.instructions.update(other.instructions)
+        self.bytes_written += other.bytes_written
+
+    def format(self) -> str:
+        """
+        Returns:
+            str: a human readable report of the counters.
+        """
+        lines = [f'{self.name}:',
+                 f'  {"lexing":<30} {self.lexing_time * 1000:9.2f} ms']
+        for name, (calls, seconds) in sorted(
+                self.productions.items(), key=lambda item: -item[1][1]):
+            lines.append(f'  {name:<30} {seconds * 1000:9.2f} ms '
+                         f'{calls:8} calls')
+        lines.append(f'  {"symbol table lookups":<30} {self.lookups:9}')
+        lines.append(f'  {"VM instructions":<30} '
+                     f'{sum(self.instructions.values()):9}')
+        for category, count in sorted(self.instructions.items()):
+            lines.append(f'    {category:<28} {count:9}')
+        lines.append(f'  {"bytes written":<30} {self.bytes_written:9}')
+        return "\n".join(lines)
+
+
+class CountingStream:
+    """Forwards writes to a stream, counting what passes through."""
+
+    def __init__(self, stream, stats: CompilerStats) -> None:
+        self.stream = stream
+        self.stats = stats
+
+    def write(self, chunk: typing.Union[str, bytes]) -> int:
+        self.stats.bytes_written += len(chunk)
+        return self.stream.write(chunk)
+
+
+def profile(function: typing.Callable[[], typing.Any], path: str
+            ) -> typing.Any:
+    """Runs a function under a profiler and writes the profile to a file: a
+    flamegraph compatible collapsed-stack file if the path ends in ".folded"
+    or ".collapsed", and pstats data otherwise.
+
+    Args:
+        function (typing.Callable[[], typing.Any]): the function to profile.
+        path (str): the path of the profile to write.
+
+    Returns:
+        typing.Any: the value returned by the function.
+    """
+    if not path.endswith(COLLAPSED_SUFFIXES):
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function)
+        finally:
+            profiler.dump_stats(path)
+    # cProfile only keeps caller and callee pairs, so whole stacks are
+    # collected by a profile hook of our own
+    stack: typing.List[typing.List] = []
+    totals: typing.Dict[str, float] = collections.defaultdict(float)
+
+    def hook(frame, event, arg):
+        now = time.perf_counter()
+        if event in ("call", "c_call"):
+            code = frame.f_code
+            name = f'{getattr(arg, "__qualname__", "?")}' \
+                if event == "c_call" else \
+                f'{os.path.basename(code.co_filename)}:{code.co_name}'
+            path_name = f'{stack[-1][0]};{name}' if stack else name
+            stack.append([path_name, now, 0.0])
+        elif stack:
+            path_name, start, nested = stack.pop()
+            elapsed = now - start
+            totals[path_name] += elapsed - nested
+            if stack:
+                stack[-1][2] += elapsed
+    sys.setprofile(hook)
+    try:
+        return function()
+    finally:
+        sys.setprofile(None)
+        with open(path, 'w') as profile_file:
+            for path_name, seconds in sorted(totals.items()):
+                microseconds = round(seconds * 1e6)
+                if microseconds:
+                    profile_file.write(f'{path_name} {microseconds}\n')
@@ -0,0 +1,258 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from IntermediateCode import COMPARISONS, Instruction, Opcode, Segment, \
+    Subroutine
+
+# the most instructions of a loop test copied to the end of the loop's body
+DUPLICATE_LIMIT = 12
+NOT = (Opcode.NOT, Segment.NONE, 0, None)
+
+
+class BasicBlock:
+    """A run of instructions that is only entered at its start and only left
+    at its end: by its conditional branch, if it has one, and otherwise by
+    continuing to its successor, or by returning if it has none.
+    """
+    __slots__ = ('label', 'instructions', 'branch', 'successor')
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.instructions: typing.List[Instruction] = []
+        self.branch: typing.Optional[str] = None
+        self.successor: typing.Optional[str] = None
+
+    def invertible(self) -> bool:
+        """Checks whether the block branches on the negation of a
+        comparison, so that the "not" may be dropped and its targets swapped.
+        """
+        return self.branch is not None and \
+            self.instructions[-1:] == [NOT] and \
+            len(self.instructions) > 1 and \
+            self.instructions[-2][0] in COMPARISONS
+
+    def invert(self) -> None:
+        self.instructions.pop()
+        self.branch, self.successor = self.successor, self.branch
+
+
+class ControlFlowOptimizer:
+    """Rebuilds the control flow of a subroutine from a graph of its basic
+    blocks:
+
+    - jumps to blocks that only pass control on are threaded to the block
+      they lead to, and blocks nothing reaches are dropped.
+    - loops are rotated: the jump back to the test of a loop is replaced by a
+      copy of the test that branches back to the top of the body, so that
+      every iteration runs a single branch rather than a "not", an "if-goto"
+      and a "goto". The test must be a comparison, whose result is a proper
+      boolean, and no longer than DUPLICATE_LIMIT instructions.
+    - conditions that are negated comparisons are inverted, dropping the
+      "not", where the block it then falls through to has no other way in.
+    - blocks are laid out so that each falls through to its successor
+      wherever possible, leaving a "goto" only where it cannot.
+    """
+
+    def optimize(self, subroutine: Subroutine) -> Subroutine:
+        """
+        Args:
+            subroutine (Subroutine): the instructions of a function.
+
+        Returns:
+            Subroutine: the function with its blocks rearranged.
+        """
+        if not len(subroutine):
+            return subroutine
+        blocks = self.build(subroutine)
+        self.thread(blocks)
+        self.rotate_loops(blocks)
+        self.thread(blocks)
+        entry = next(iter(blocks.values()))
+        reachable = self.reachable(blocks, entry)
+        blocks = {label: block for label, block in blocks.items()
+                  if label in reachable}
+        return Subroutine(subroutine.name, subroutine.n_locals,
+                          self.serialize(self.layout(blocks, entry)))
+
+    @staticmethod
+    def build(subroutine: Subroutine) -> typing.Dict[str, BasicBlock]:
+        """
+        Returns:
+            typing.Dict[str, BasicBlock]: the basic blocks of the subroutine
+            in their original order, by label, starting with its entry. Blocks
+            that had no label get a new one, and blocks that had several keep
+            the first.
+        """
+        blocks: typing.Dict[str, BasicBlock] = {}
+        # the block of every label, including the ones merged into a block
+        aliases: typing.Dict[str, str] = {}
+        # the block being filled, and the block that continues into the next
+        # one after its conditional branch
+        current: typing.Optional[BasicBlock] = None
+        pending: typing.Optional[BasicBlock] = None
+        # the names a new label must not take
+        names = set(subroutine.strings)
+
+        def start_block(label: str) -> BasicBlock:
+            block = blocks[label] = BasicBlock(label)
+            aliases[label] = label
+            previous = current if current is not None else pending
+            if previous is not None:
+                previous.successor = label
+            return block
+
+        for instruction in subroutine:
+            opcode, _, _, name = instruction
+            if opcode == Opcode.LABEL:
+                if current is not None and not current.instructions:
+                    # consecutive labels name the same block
+                    aliases[name] = current.label
+                else:
+                    current, pending = start_block(name), None
+                continue
+            if current is None:
+                # code after a jump, which no label may lead to. A ':' is
+                # legal in VM labels but not in Jack identifiers, so the new
+                # label cannot clash with those of the engine, and only with
+                # the ones made by an earlier run of this pass
+                label = f'{subroutine.name}:B{len(blocks)}'
+                while label in names:
+                    label += ':'
+                current, pending = start_block(label), None
+            if opcode == Opcode.GOTO:
+                current.successor = name
+                current = None
+            elif opcode == Opcode.IF_GOTO:
+                current.branch = name
+                current, pending = None, current
+            else:
+                current.instructions.append(instruction)
+                if opcode == Opcode.RETURN:
+                    current = None
+        for block in blocks.values():
+            if block.branch is not None:
+                block.branch = aliases[block.branch]
+            if block.successor is not None:
+                block.successor = aliases[block.successor]
+        return blocks
+
+    @staticmethod
+    def thread(blocks: typing.Dict[str, BasicBlock]) -> None:
+        """Retargets the jumps to blocks that have no instructions and no
+        branch to where those blocks lead.
+        """
+        def destination(label: typing.Optional[str]) -> typing.Optional[str]:
+            seen = set()
+            while label is not None and label not in seen:
+                block = blocks[label]
+                if block.instructions or block.branch is not None or \
+                        block.successor is None:
+                    break
+                seen.add(label)
+                label = block.successor
+            return label
+
+        for block in blocks.values():
+            block.branch = destination(block.branch)
+            block.successor = destination(block.successor)
+            if block.branch is not None and block.branch == block.successor:
+                # both ways lead to the same place, only the condition is left
+                block.instructions.append((Opcode.POP, Segment.TEMP, 0, None))
+                block.branch = None
+
+    @staticmethod
+    def rotate_loops(blocks: typing.Dict[str, BasicBlock]) -> None:
+        """Replaces the jumps back to a loop test by a copy of the test,
+        inverted so that it branches back into the loop and continues to
+        its exit.
+        """
+        positions = {label: position
+                     for position, label in enumerate(blocks)}
+        for block in blocks.values():
+            if block.branch is not None or block.successor is None:
+                continue
+            test = blocks[block.successor]
+            if test is block or positions[test.label] > \
+                    positions[block.label] or not test.invertible() or \
+                    len(test.instructions) > DUPLICATE_LIMIT:
+                continue
+            block.instructions.extend(test.instructions[:-1])
+            block.branch = test.successor
+            block.successor = test.branch
+
+    @staticmethod
+    def reachable(blocks: typing.Dict[str, BasicBlock], entry: BasicBlock
+                  ) -> typing.Set[str]:
+        reached = {entry.label}
+        pending = [entry]
+        while pending:
+            block = pending.pop()
+            for label in (block.branch, block.successor):
+                if label is not None and label not in reached:
+                    reached.add(label)
+                    pending.append(blocks[label])
+        return reached
+
+    @staticmethod
+    def layout(blocks: typing.Dict[str, BasicBlock], entry: BasicBlock
+               ) -> typing.List[BasicBlock]:
+        """Orders the blocks in chains that fall through from each block to
+        its successor, starting with the entry and otherwise keeping the
+        original order.
+        """
+        predecessors: typing.Dict[str, int] = dict.fromkeys(blocks, 0)
+        for block in blocks.values():
+            for label in (block.branch, block.successor):
+                if label is not None:
+                    predecessors[label] += 1
+        placed: typing.Set[str] = set()
+        order: typing.List[BasicBlock] = []
+        for label in [entry.label] + list(blocks):
+            while label is not None and label not in placed:
+                block = blocks[label]
+                placed.add(label)
+                order.append(block)
+                # branching on the comparison itself drops the "not", and
+                # falling through to the old branch target costs no jump
+                # when nothing else leads there
+                if block.invertible() and block.branch not in placed and (
+                        predecessors[block.branch] == 1
+                        or block.successor in placed):
+                    block.invert()
+                label = block.successor
+        return order
+
+    @staticmethod
+    def serialize(order: typing.List[BasicBlock]
+                  ) -> typing.List[Instruction]:
+        """
+        Returns:
+            typing.List[Instruction]: the instructions of the laid out blocks,
+            with a label on every block that is jumped to, and a goto after
+            every block that does not fall through to its successor.
+        """
+        following = [block.label for block in order[1:]] + [None]
+        targets = set()
+        for block, next_label in zip(order, following):
+            if block.branch is not None:
+                targets.add(block.branch)
+            if block.successor is not None and block.successor != next_label:
+                targets.add(block.successor)
+        instructions: typing.List[Instruction] = []
+        for block, next_label in zip(order, following):
+            if block.label in targets:
+                instructions.append(
+                    (Opcode.LABEL, Segment.NONE, 0, block.label))
+            instructions.extend(block.instructions)
+            if block.branch is not None:
+                instructions.append(
+                    (Opcode.IF_GOTO, Segment.NONE, 0, block.branch))
+            if block.successor is not None and block.successor != next_label:
+                instructions.append(
+                    (Opcode.GOTO, Segment.NONE, 0, block.successor))
+        return instructions
@@ -0,0 +1,192 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from ClassIndex import OS_SUBROUTINES
+from VMFile import read_commands, write_commands
+
+# the functions a program starts from: the VM bootstrap calls Sys.init, which
+# calls Main.main
+ENTRY_POINTS = ('Sys.init', 'Main.main')
+# commands that fold the constant on top of the stack into a branch condition
+CONDITION_FOLDS = {'not\n': lambda value: ~value,
+                   'neg\n': lambda value: -value}
+
+
+class DeadCodeEliminator:
+    """Removes the code of a whole program that can never run: subroutines
+    that cannot be reached from the entry points through calls, and commands
+    that cannot be reached within a subroutine, such as those after a return
+    or behind a branch on a constant condition.
+
+    It works on the compiled VM commands of every class of the program, so it
+    sees the calls made by all of them.
+    """
+
+    def eliminate(self, units: typing.Dict[str, typing.List[str]]
+                  ) -> typing.Dict[str, typing.List[str]]:
+        """
+        Args:
+            units (typing.Dict[str, typing.List[str]]): the VM commands of
+            every compilation unit, each ending in a newline, by unit name.
+
+        Returns:
+            typing.Dict[str, typing.List[str]]: the reachable commands of every
+            unit. Units are returned unchanged when the program has no entry
+            point, since a library may be called by any of its subroutines.
+        """
+        functions: typing.Dict[str, typing.List[str]] = {}
+        unit_functions: typing.Dict[str, typing.List[str]] = {}
+        for unit, commands in units.items():
+            unit_functions[unit] = []
+            for name, body in self.split_functions(commands):
+                functions[name] = self.prune_function(body)
+                unit_functions[unit].append(name)
+        if not any(entry in functions for entry in ENTRY_POINTS):
+            return units
+        reachable = self.reachable_functions(functions,
+                                             self.entry_points(functions))
+        return {unit: [command for name in names if name in reachable
+                       for command in functions[name]]
+                for unit, names in unit_functions.items()}
+
+    @staticmethod
+    def split_functions(commands: typing.List[str]
+                        ) -> typing.List[typing.Tuple[str, typing.List[str]]]:
+        """
+        Returns:
+            typing.List[typing.Tuple[str, typing.List[str]]]: the name and
+            commands of every function, in order.
+        """
+        functions = []
+        for command in commands:
+            if command.startswith('function '):
+                functions.append((command.split()[1], []))
+            if functions:
+                functions[-1][1].append(command)
+        return functions
+
+    def prune_function(self, commands: typing.List[str]) -> typing.List[str]:
+        """Removes the commands of a function that no path reaches.
+
+        Args:
+            commands (typing.List[str]): the commands of a single function.
+
+        Returns:
+            typing.List[str]: the reachable commands.
+        """
+        commands = self.fold_branches(commands)
+        labels = {command[6:]: position
+                  for position, command in enumerate(commands)
+                  if command.startswith('label ')}
+        reachable = [False] * len(commands)
+        pending = [0]
+        while pending:
+            position = pending.pop()
+            while position < len(commands) and not reachable[position]:
+                reachable[position] = True
+                command = commands[position]
+                if command.startswith('if-goto '):
+                    pending.append(labels[command[8:]])
+                elif command.startswith('goto '):
+                    position = labels[command[5:]]
+                    continue
+                elif command == 'return\n':
+                    break
+                position += 1
+        commands = [command for position, command in enumerate(commands)
+                    if reachable[position]]
+        # jumps to the very next command, and labels no jump targets
+        commands = [command for position, command in enumerate(commands)
+                    if not (command.startswith('goto ') and
+                            commands[position + 1:position + 2] ==
+                            ['label ' + command[5:]])]
+        targets = {command.split()[1] for command in commands
+                   if command.startswith(('goto ', 'if-goto '))}
+        return [command for command in commands
+                if not command.startswith('label ')
+                or command.split()[1] in targets]
+
+    @staticmethod
+    def fold_branches(commands: typing.List[str]) -> typing.List[str]:
+        """Replaces conditional branches on constants by a goto when the
+        condition always holds, and removes them when it never does.
+        """
+        output: typing.List[str] = []
+        for command in commands:
+            if not command.startswith('if-goto '):
+                output.append(command)
+                continue
+            start = len(output)
+            while start > 0 and output[start - 1] in CONDITION_FOLDS:
+                start -= 1
+            if start == 0 or not output[start - 1].startswith(
+                    'push constant '):
+                output.append(command)
+                continue
+            value = int(output[start - 1].split()[2])
+            for fold in output[start:]:
+                value = CONDITION_FOLDS[fold](value)
+            del output[start - 1:]
+            if value != 0:
+                output.append('goto ' + command[8:])
+        return output
+
+    @staticmethod
+    def entry_points(functions: typing.Dict[str, typing.List[str]]
+                     ) -> typing.List[str]:
+        """
+        Returns:
+            typing.List[str]: the functions the program may start from. A
+            program without its own Sys.init runs on the standard one, which
+            initializes the OS classes and calls their subroutines, so the OS
+            subroutines the program defines itself are kept as well.
+        """
+        entries = [entry for entry in ENTRY_POINTS if entry in functions]
+        if 'Sys.init' not in functions:
+            entries += [f'{class_name}.{name}'
+                        for class_name, subroutines in OS_SUBROUTINES.items()
+                        for name in subroutines
+                        if f'{class_name}.{name}' in functions]
+        return entries
+
+    @staticmethod
+    def reachable_functions(functions: typing.Dict[str, typing.List[str]],
+                            entries: typing.List[str]) -> typing.Set[str]:
+        """
+        Args:
+            functions (typing.Dict[str, typing.List[str]]): the commands of
+            every function of the program, by name.
+            entries (typing.List[str]): the functions to start from.
+
+        Returns:
+            typing.Set[str]: the functions that the entries call, directly or
+            indirectly, including themselves.
+        """
+        pending = list(entries)
+        reachable = set(pending)
+        while pending:
+            for command in functions[pending.pop()]:
+                if command.startswith('call '):
+                    callee = command.split()[1]
+                    if callee in functions and callee not in reachable:
+                        reachable.add(callee)
+                        pending.append(callee)
+        return reachable
+
+    def eliminate_paths(self, output_paths: typing.List[str]) -> None:
+        """Rewrites the ".vm" or ".vmb" files of a whole program in place.
+
+        Args:
+            output_paths (typing.List[str]): paths of every compiled file of
+            the program.
+        """
+        units = {output_path: read_commands(output_path)
+                 for output_path in output_paths}
+        for output_path, commands in self.eliminate(units).items():
+            if commands != units[output_path]:
+                write_commands(output_path, commands)
@@ -0,0 +1,201 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from IntermediateCode import Instruction, Opcode, Pass, Segment, Subroutine, \
+    parse
+from LocalAllocator import LocalAllocator
+from VMFile import read_commands, write_commands
+from VMWriter import VMWriter
+
+# the most instructions a subroutine may have, not counting its return, to be
+# inlined
+INLINE_LIMIT = 16
+# the temp slots that hold the arguments and locals of an inlined body, and
+# the caller's "this" while it runs; temp 0 and temp 1 are left to the
+# commands the engine writes for array stores and divisions
+INLINE_TEMPS = range(2, 8)
+
+
+class InlineBody:
+    """The body of a subroutine that can be substituted at its call sites."""
+    __slots__ = ('class_name', 'instructions', 'n_locals', 'zeroed_locals',
+                 'sets_this', 'uses_static')
+
+    def __init__(self, subroutine: Subroutine,
+                 instructions: typing.List[Instruction]) -> None:
+        """
+        Args:
+            subroutine (Subroutine): the inlined subroutine.
+            instructions (typing.List[Instruction]): its instructions without
+            the final return.
+        """
+        self.class_name = subroutine.name.split('.', 1)[0]
+        self.instructions = instructions
+        self.n_locals = subroutine.n_locals
+        # the locals read before they are written, which the VM would have
+        # cleared
+        live_in, _ = LocalAllocator.liveness(list(subroutine))
+        self.zeroed_locals = LocalAllocator.members(live_in[0])
+        self.sets_this = (Opcode.POP, Segment.POINTER, 0, None) \
+            in instructions
+        self.uses_static = any(segment == Segment.STATIC
+                               for _, segment, _, _ in instructions)
+
+
+class Inliner:
+    """Substitutes the bodies of small leaf subroutines at their call sites
+    across a whole program, which saves the frame a VM call sets up and tears
+    down.
+
+    A subroutine is inlined if it makes no calls and no jumps, ends in its
+    only return, and has at most INLINE_LIMIT other instructions. Its
+    arguments and locals are moved into the INLINE_TEMPS slots, so it must
+    not need more of them than there are, and when it sets "this", as methods
+    do, the caller's "this" is saved and restored around it. A body that
+    touches statics is only inlined within its own class, whose static
+    segment it refers to. The subroutines themselves are kept, since they may
+    still be called from elsewhere; DeadCodeEliminator removes them once
+    they are not.
+    """
+
+    def __init__(self, passes: typing.Sequence[Pass] = ()) -> None:
+        """
+        Args:
+            passes (typing.Sequence[Pass]): run over every caller that had
+            calls inlined, in order.
+        """
+        self.passes = passes
+
+    def inline(self, units: typing.Dict[str, typing.List[Subroutine]]
+               ) -> typing.Dict[str, typing.List[Subroutine]]:
+        """
+        Args:
+            units (typing.Dict[str, typing.List[Subroutine]]): the subroutines
+            of every compilation unit, by unit name.
+
+        Returns:
+            typing.Dict[str, typing.List[Subroutine]]: the subroutines of
+            every unit, with the calls to inlinable subroutines replaced by
+            their bodies.
+        """
+        bodies = {}
+        for subroutines in units.values():
+            for subroutine in subroutines:
+                body = self.inline_body(subroutine)
+                if body is not None:
+                    bodies[subroutine.name] = body
+        return {unit: [self.inline_calls(subroutine, bodies)
+                       for subroutine in subroutines]
+                for unit, subroutines in units.items()}
+
+    @staticmethod
+    def inline_body(subroutine: Subroutine) -> typing.Optional[InlineBody]:
+        """
+        Returns:
+            typing.Optional[InlineBody]: the body of the subroutine, or None
+            if it cannot be inlined.
+        """
+        instructions = list(subroutine)
+        if not instructions or len(instructions) > INLINE_LIMIT + 1 or \
+                instructions[-1][0] != Opcode.RETURN:
+            return None
+        instructions.pop()
+        for opcode, _, _, _ in instructions:
+            if opcode in (Opcode.CALL, Opcode.RETURN, Opcode.LABEL,
+                          Opcode.GOTO, Opcode.IF_GOTO):
+                return None
+        return InlineBody(subroutine, instructions)
+
+    def inline_calls(self, caller: Subroutine,
+                     bodies: typing.Dict[str, InlineBody]) -> Subroutine:
+        """
+        Returns:
+            Subroutine: the caller, with its calls to the given bodies
+            replaced by them.
+        """
+        class_name = caller.name.split('.', 1)[0]
+        instructions: typing.List[Instruction] = []
+        inlined = False
+        for instruction in caller:
+            opcode, _, n_args, name = instruction
+            body = bodies.get(name) if opcode == Opcode.CALL else None
+            if body is None or name == caller.name or \
+                    (body.uses_static and body.class_name != class_name):
+                instructions.append(instruction)
+                continue
+            expansion = self.expand(body, n_args)
+            if expansion is None:
+                instructions.append(instruction)
+                continue
+            instructions.extend(expansion)
+            inlined = True
+        if not inlined:
+            return caller
+        subroutine = Subroutine(caller.name, caller.n_locals, instructions)
+        for optimization in self.passes:
+            subroutine = optimization(subroutine)
+        return subroutine
+
+    @staticmethod
+    def expand(body: InlineBody, n_args: int
+               ) -> typing.Optional[typing.List[Instruction]]:
+        """
+        Args:
+            body (InlineBody): the inlined subroutine.
+            n_args (int): the number of arguments the call passes.
+
+        Returns:
+            typing.Optional[typing.List[Instruction]]: the instructions that
+            replace the call, which leave the returned value on the stack, or
+            None if its arguments and locals do not fit the temp slots.
+        """
+        slots = n_args + body.n_locals + body.sets_this
+        if slots > len(INLINE_TEMPS):
+            return None
+        arguments = INLINE_TEMPS[:n_args]
+        locals_ = INLINE_TEMPS[n_args:n_args + body.n_locals]
+        # the arguments were pushed in order, so the last one is on top
+        expansion: typing.List[Instruction] = [
+            (Opcode.POP, Segment.TEMP, slot, None)
+            for slot in reversed(arguments)]
+        for index in body.zeroed_locals:
+            expansion.append((Opcode.PUSH, Segment.CONSTANT, 0, None))
+            expansion.append((Opcode.POP, Segment.TEMP, locals_[index], None))
+        if body.sets_this:
+            saved_this = INLINE_TEMPS[slots - 1]
+            expansion.append((Opcode.PUSH, Segment.POINTER, 0, None))
+            expansion.append((Opcode.POP, Segment.TEMP, saved_this, None))
+        for opcode, segment, index, name in body.instructions:
+            if segment == Segment.ARGUMENT:
+                if index >= n_args:
+                    return None
+                segment, index = Segment.TEMP, arguments[index]
+            elif segment == Segment.LOCAL:
+                segment, index = Segment.TEMP, locals_[index]
+            expansion.append((opcode, segment, index, name))
+        if body.sets_this:
+            expansion.append((Opcode.PUSH, Segment.TEMP, saved_this, None))
+            expansion.append((Opcode.POP, Segment.POINTER, 0, None))
+        return expansion
+
+    def inline_paths(self, output_paths: typing.List[str]) -> None:
+        """Rewrites the ".vm" or ".vmb" files of a whole program in place.
+
+        Args:
+            output_paths (typing.List[str]): paths of every compiled file of
+            the program.
+        """
+        units = {output_path: parse(read_commands(output_path))
+                 for output_path in output_paths}
+        for output_path, subroutines in self.inline(units).items():
+            if all(new is old for new, old in zip(subroutines,
+                                                  units[output_path])):
+                continue
+            write_commands(output_path, [
+                command for subroutine in subroutines
+                for command in VMWriter.serialize(subroutine)])
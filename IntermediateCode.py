@@ -0,0 +1,258 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import typing
+from enum import IntEnum
+
+
+class Opcode(IntEnum):
+    PUSH = 0
+    POP = 1
+    ADD = 2
+    SUB = 3
+    NEG = 4
+    EQ = 5
+    GT = 6
+    LT = 7
+    AND = 8
+    OR = 9
+    NOT = 10
+    SHIFTLEFT = 11
+    SHIFTRIGHT = 12
+    LABEL = 13
+    GOTO = 14
+    IF_GOTO = 15
+    CALL = 16
+    RETURN = 17
+
+
+class Segment(IntEnum):
+    NONE = 0
+    CONSTANT = 1
+    ARGUMENT = 2
+    LOCAL = 3
+    STATIC = 4
+    THIS = 5
+    THAT = 6
+    POINTER = 7
+    TEMP = 8
+
+
+# the VM syntax of every opcode and segment
+COMMAND_NAMES = {opcode: opcode.name.lower().replace('_', '-')
+                 for opcode in Opcode}
+SEGMENT_NAMES = {segment: segment.name.lower() for segment in Segment}
+SEGMENTS = {name: segment for segment, name in SEGMENT_NAMES.items()}
+OPCODES = {name: opcode for opcode, name in COMMAND_NAMES.items()}
+# commands whose result is always true (-1) or false (0), so that a "not"
+# after them may be dropped by branching on the opposite outcome
+COMPARISONS = frozenset([Opcode.EQ, Opcode.GT, Opcode.LT])
+# the opcode of every arithmetic command, by its VM name or Jack operator
+ARITHMETIC_OPCODES = {
+    '+': Opcode.ADD, '-': Opcode.SUB, '=': Opcode.EQ, '>': Opcode.GT,
+    '<': Opcode.LT, '&': Opcode.AND, '|': Opcode.OR, '~': Opcode.NOT,
+    '^': Opcode.SHIFTLEFT, '#': Opcode.SHIFTRIGHT, 'add': Opcode.ADD,
+    'neg': Opcode.NEG,
+}
+# opcodes whose operand is a name, and which have no segment
+NAMED_OPCODES = frozenset([Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO,
+                           Opcode.CALL])
+NO_NAME = -1
+
+# An instruction as seen by passes: its opcode, segment, integer operand (the
+# index of push and pop, the argument count of call) and name (the label of
+# label, goto and if-goto, the callee of call), with unused fields set to
+# Segment.NONE, 0 and None.
+Instruction = typing.Tuple[int, int, int, typing.Optional[str]]
+
+
+class Subroutine:
+    """The instructions of a single VM function, held as parallel arrays of
+    compact records, with the names they refer to kept once each in a string
+    table. The write_xxx() methods append instructions in the same terms as
+    the VM command syntax.
+    """
+    __slots__ = ('name', 'n_locals', 'opcodes', 'segments', 'operands',
+                 'names', 'strings', 'string_ids')
+
+    def __init__(self, name: str, n_locals: int = 0,
+                 instructions: typing.Iterable[Instruction] = ()) -> None:
+        """
+        Args:
+            name (str): the name of the function.
+            n_locals (int): the number of local variables it uses.
+            instructions (typing.Iterable[Instruction]): its initial
+            instructions.
+        """
+        self.name = name
+        self.n_locals = n_locals
+        self.opcodes = array.array('B')
+        self.segments = array.array('B')
+        self.operands = array.array('i')
+        self.names = array.array('i')
+        self.strings: typing.List[str] = []
+        self.string_ids: typing.Dict[str, int] = {}
+        instructions = list(instructions)
+        if instructions:
+            opcodes, segments, operands, names = zip(*instructions)
+            self.opcodes.extend(opcodes)
+            self.segments.extend(segments)
+            self.operands.extend(operands)
+            self.names.extend(map(self.intern, names))
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __iter__(self) -> typing.Iterator[Instruction]:
+        strings = self.strings
+        for opcode, segment, operand, name in zip(
+                self.opcodes, self.segments, self.operands, self.names):
+            yield opcode, segment, operand, \
+                strings[name] if name != NO_NAME else None
+
+    def append(self, opcode: int, segment: int = Segment.NONE,
+               operand: int = 0, name: typing.Optional[str] = None) -> None:
+        """Appends a single instruction."""
+        self.opcodes.append(opcode)
+        self.segments.append(segment)
+        self.operands.append(operand)
+        self.names.append(NO_NAME if name is None else self.intern(name))
+
+    def intern(self, name: typing.Optional[str]) -> int:
+        """
+        Returns:
+            int: the index of a name in the string table, which is added
+            there if it is missing, or NO_NAME for None.
+        """
+        if name is None:
+            return NO_NAME
+        string_id = self.string_ids.get(name)
+        if string_id is None:
+            string_id = self.string_ids[name] = len(self.strings)
+            self.strings.append(name)
+        return string_id
+
+    def mark(self) -> int:
+        """
+        Returns:
+            int: the position of the next instruction, for insert() and
+            insert_constant().
+        """
+        return len(self.opcodes)
+
+    def insert(self, position: int, write: typing.Callable[[], None]) -> None:
+        """Places the instructions appended by a callback at an earlier
+        position.
+
+        Args:
+            position (int): a position returned by mark().
+            write (typing.Callable[[], None]): appends the instructions to
+            insert to this subroutine.
+        """
+        columns = (self.opcodes, self.segments, self.operands, self.names)
+        following = [column[position:] for column in columns]
+        for column in columns:
+            del column[position:]
+        write()
+        for column, tail in zip(columns, following):
+            column.extend(tail)
+
+    def insert_constant(self, position: int, value: int) -> None:
+        """Pushes a constant at an earlier position.
+
+        Args:
+            position (int): a position returned by mark().
+            value (int): the value to push, between -32768 and 32767.
+        """
+        self.insert(position, lambda: self.write_constant(value))
+
+    def write_push(self, segment: str, index: int) -> None:
+        """
+        Args:
+            segment (str): the VM name of the segment to push from.
+            index (int): the index to push from.
+        """
+        self.append(Opcode.PUSH, SEGMENTS[segment], index)
+
+    def write_constant(self, value: int) -> None:
+        """Pushes a signed 16-bit constant, which takes a trailing "not" when
+        the value is negative.
+
+        Args:
+            value (int): the value to push, between -32768 and 32767.
+        """
+        if value < 0:
+            self.append(Opcode.PUSH, Segment.CONSTANT, ~value)
+            self.append(Opcode.NOT)
+        else:
+            self.append(Opcode.PUSH, Segment.CONSTANT, value)
+
+    def write_pop(self, segment: str, index: int) -> None:
+        """
+        Args:
+            segment (str): the VM name of the segment to pop to.
+            index (int): the index to pop to.
+        """
+        self.append(Opcode.POP, SEGMENTS[segment], index)
+
+    def write_arithmetic(self, command: str) -> None:
+        """
+        Args:
+            command (str): a Jack operator, or "add" or "neg".
+        """
+        self.append(ARITHMETIC_OPCODES[command])
+
+    def write_label(self, label: str) -> None:
+        self.append(Opcode.LABEL, name=label)
+
+    def write_goto(self, label: str) -> None:
+        self.append(Opcode.GOTO, name=label)
+
+    def write_if(self, label: str) -> None:
+        self.append(Opcode.IF_GOTO, name=label)
+
+    def write_call(self, name: str, n_args: int) -> None:
+        self.append(Opcode.CALL, operand=n_args, name=name)
+
+    def write_return(self) -> None:
+        self.append(Opcode.RETURN)
+
+
+# an optimization over the instructions of a single subroutine
+Pass = typing.Callable[[Subroutine], Subroutine]
+
+
+def parse(commands: typing.Iterable[str]) -> typing.List[Subroutine]:
+    """Reads VM commands back into subroutines.
+
+    Args:
+        commands (typing.Iterable[str]): the lines of a ".vm" file.
+
+    Returns:
+        typing.List[Subroutine]: its functions, in order.
+    """
+    subroutines: typing.List[Subroutine] = []
+    for command in commands:
+        words = command.split("//", 1)[0].split()
+        if not words:
+            continue
+        if words[0] == "function":
+            subroutines.append(Subroutine(words[1], int(words[2])))
+            continue
+        if not subroutines:
+            raise ValueError(f"command outside of a function: {command!r}")
+        opcode = OPCODES[words[0]]
+        if opcode == Opcode.PUSH or opcode == Opcode.POP:
+            subroutines[-1].append(opcode, SEGMENTS[words[1]], int(words[2]))
+        elif opcode == Opcode.CALL:
+            subroutines[-1].append(opcode, operand=int(words[2]),
+                                   name=words[1])
+        else:
+            subroutines[-1].append(opcode, name=words[1]
+                                   if len(words) > 1 else None)
+    return subroutines
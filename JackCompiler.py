@@ -5,30 +5,349 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import errno
+import io
 import os
 import sys
 import typing
-from CompilationEngine import CompilationEngine
+import functools
+# only the modules every build needs are imported here; worker pools,
+# statistics and profiling are imported when they are asked for, keeping
+# startup within the budget checked by benchmarks/startup.py
+from BinaryVMWriter import BINARY_EXTENSION
+from BuildCache import BuildCache, MANIFEST_NAME
+from ClassIndex import ClassIndex
+from CompilationEngine import CompilationEngine, CompilationError, \
+    OPTIMIZATIONS, OPT_IN_OPTIMIZATIONS, OUTPUT_FORMATS, \
+    WHOLE_PROGRAM_OPTIMIZATIONS, create_passes
 from JackTokenizer import JackTokenizer
 from SymbolTable import SymbolTable
 from VMWriter import VMWriter
+if typing.TYPE_CHECKING:
+    from CompilerStats import CompilerStats
+
+# the extension of the files written in each output format
+OUTPUT_EXTENSIONS = {"text": ".vm", "binary": BINARY_EXTENSION}
+# the function a worker process of compile_paths() compiles each file with.
+# It carries the class index of the whole program, so it is sent once to
+# every worker by init_worker() rather than pickled along with every file
+worker_compile_unit: typing.Optional[typing.Callable] = None
 
 
 def compile_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.Union[typing.TextIO, typing.BinaryIO],
+        output_file: typing.Union[typing.TextIO, typing.BinaryIO],
+        optimizations: typing.Collection[str] = (),
+        stats: typing.Optional["CompilerStats"] = None,
+        index: typing.Optional[ClassIndex] = None,
+        output_format: str = "text") -> None:
     """Compiles a single file.
 
     Args:
-        input_file (typing.TextIO): the file to compile.
-        output_file (typing.TextIO): writes all output to this file.
+        input_file: the file to compile, a text stream or a binary one
+        which is then memory mapped, see JackTokenizer.
+        output_file: writes all output to this file, which must be binary
+        for the binary output format.
+        optimizations (typing.Collection[str]): names of the optimizations
+        to apply, see CompilationEngine.OPTIMIZATIONS.
+        stats (CompilerStats): if given, records where the compilation's
+        time went into these counters.
+        index (ClassIndex): the signatures of the program's classes, used to
+        resolve and check calls.
+        output_format (str): the encoding of the output, one of
+        CompilationEngine.OUTPUT_FORMATS.
     """
     # Your code goes here!
     # This function should be relatively similar to "analyze_file" in
     # JackAnalyzer.py from the previous project.
+    # All the state of a compilation lives in the objects created here, so
+    # its output does not depend on which files were compiled before it.
     tokenizer = JackTokenizer(input_file)
-    engine = CompilationEngine(tokenizer, output_file)
+    if stats is None:
+        engine = CompilationEngine(tokenizer, output_file, optimizations,
+                                   index, output_format)
+    else:
+        engine = stats.create_engine(tokenizer, output_file, optimizations,
+                                     index, output_format)
     engine.compile_class()
-    pass
+
+
+class Compiler:
+    """Compiles Jack classes in process, from and to strings or buffers.
+
+    A Compiler only holds the settings of its compilations and the signatures
+    of the program's classes. Every compilation creates its own tokenizer,
+    engine, symbol table and writer and drops them when it is done, so
+    compilations do not affect each other, memory does not grow with their
+    number, and one Compiler may be used by several threads at once.
+    """
+
+    def __init__(self, optimizations: typing.Collection[str] = (),
+                 index: typing.Optional[ClassIndex] = None,
+                 output_format: str = "text") -> None:
+        """
+        Args:
+            optimizations (typing.Collection[str]): names of the optimizations
+            to apply. "inline" and "dce" need the whole program and only
+            apply in build().
+            index (ClassIndex): the signatures of the program's classes, used
+            to resolve and check calls. It must not change while compilations
+            are running. If not given, every compilation indexes the class it
+            compiles, so that its calls resolve as they do in build() for a
+            program of that single class.
+            output_format (str): the encoding of the output, one of
+            CompilationEngine.OUTPUT_FORMATS.
+        """
+        self.optimizations = frozenset(optimizations)
+        self.index = index
+        self.output_format = output_format
+
+    def compile(self, source: typing.Union[str, bytes]
+                ) -> typing.Union[str, bytes]:
+        """Compiles a single class.
+
+        Args:
+            source (typing.Union[str, bytes]): the source of the class, as
+            text or as its encoded bytes.
+
+        Returns:
+            typing.Union[str, bytes]: the VM commands, as text, or as bytes in
+            the binary output format.
+        """
+        input_file = io.StringIO(source) if isinstance(source, str) \
+            else io.BytesIO(source)
+        output_file = io.StringIO() if self.output_format == "text" \
+            else io.BytesIO()
+        compile_file(input_file, output_file, self.optimizations,
+                     index=self.index_of(source),
+                     output_format=self.output_format)
+        return output_file.getvalue()
+
+    def compile_stream(
+            self, input_file: typing.Union[typing.TextIO, typing.BinaryIO],
+            output_file: typing.Union[typing.TextIO, typing.BinaryIO]
+    ) -> None:
+        """Compiles a single class from a stream into another, see
+        compile_file(). Without an index, the stream is read whole first to
+        index its class.
+        """
+        index = self.index
+        if index is None:
+            source = input_file.read()
+            index = self.index_of(source)
+            input_file = io.StringIO(source) if isinstance(source, str) \
+                else io.BytesIO(source)
+        compile_file(input_file, output_file, self.optimizations,
+                     index=index, output_format=self.output_format)
+
+    def index_of(self, source: typing.Union[str, bytes]) -> ClassIndex:
+        """
+        Returns:
+            ClassIndex: the index to compile the given source with, which is
+            a new index of its own class if the Compiler has none.
+        """
+        if self.index is not None:
+            return self.index
+        index = ClassIndex()
+        index.add_source(source)
+        return index
+
+
+def compile_path(input_path: str, optimizations: typing.Collection[str] = (),
+                 stats: typing.Optional["CompilerStats"] = None,
+                 index: typing.Optional[ClassIndex] = None,
+                 output_format: str = "text") -> typing.Optional[str]:
+    """Compiles the file at the given path into a ".vm" file next to it, or a
+    ".vmb" file in the binary output format.
+
+    Args:
+        input_path (str): path of the ".jack" file to compile.
+        optimizations (typing.Collection[str]): the optimizations to apply.
+        stats (CompilerStats): if given, records the compilation into these
+        counters.
+        index (ClassIndex): the signatures of the program's classes.
+        output_format (str): the encoding of the output.
+
+    Returns:
+        typing.Optional[str]: a description of the error that stopped the
+        compilation, or None if the file compiled successfully.
+    """
+    output_path = os.path.splitext(input_path)[0] + \
+        OUTPUT_EXTENSIONS[output_format]
+    # the output is renamed into place only once it is complete, so a failed
+    # compilation never leaves a truncated ".vm" file behind
+    temp_path = output_path + ".tmp"
+    try:
+        with open(input_path, 'rb') as input_file, \
+                open(temp_path, 'w' if output_format == "text" else 'wb'
+                     ) as output_file:
+            compile_file(input_file, output_file, optimizations, stats,
+                         index, output_format)
+        os.replace(temp_path, output_path)
+    except (Exception, CompilationError) as error:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return f'{input_path}: {type(error).__name__}: {error}'
+    return None
+
+
+def compile_path_with_stats(
+        input_path: str, optimizations: typing.Collection[str] = (),
+        index: typing.Optional[ClassIndex] = None, output_format: str = "text"
+) -> typing.Tuple[typing.Optional[str], "CompilerStats"]:
+    """Compiles the file at the given path like compile_path(), and returns
+    its statistics along with its error, so they can cross process boundaries.
+    """
+    from CompilerStats import CompilerStats
+    stats = CompilerStats(os.path.basename(input_path))
+    return compile_path(input_path, optimizations, stats, index,
+                        output_format), stats
+
+
+def compile_paths(input_paths: typing.List[str], jobs: int = 1,
+                  optimizations: typing.Collection[str] = (),
+                  stats: typing.Optional[typing.Dict[str, "CompilerStats"]]
+                  = None, index: typing.Optional[ClassIndex] = None,
+                  output_format: str = "text") -> typing.Dict[str, str]:
+    """Compiles several files, possibly across a pool of worker processes.
+
+    Args:
+        input_paths (typing.List[str]): paths of the ".jack" files to compile.
+        jobs (int): number of worker processes, 0 for one per CPU.
+        optimizations (typing.Collection[str]): the optimizations to apply.
+        stats (typing.Dict[str, CompilerStats]): if given, receives the
+        statistics of every file, by path.
+        index (ClassIndex): the signatures of the program's classes.
+        output_format (str): the encoding of the output.
+
+    Returns:
+        typing.Dict[str, str]: the error of every failed file, in input order.
+    """
+    compile_unit = functools.partial(
+        compile_path if stats is None else compile_path_with_stats,
+        optimizations=frozenset(optimizations), index=index,
+        output_format=output_format)
+    if jobs == 1 or len(input_paths) < 2:
+        return collect_results(input_paths, map(compile_unit, input_paths),
+                               stats)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs or None,
+                             initializer=init_worker,
+                             initargs=(compile_unit,)) as executor:
+        return collect_results(
+            input_paths, executor.map(compile_in_worker, input_paths), stats)
+
+
+def init_worker(compile_unit: typing.Callable) -> None:
+    global worker_compile_unit
+    worker_compile_unit = compile_unit
+
+
+def compile_in_worker(input_path: str):
+    return worker_compile_unit(input_path)
+
+
+def collect_results(input_paths: typing.List[str], results: typing.Iterable,
+                    stats: typing.Optional[typing.Dict[str, "CompilerStats"]]
+                    ) -> typing.Dict[str, str]:
+    errors = {}
+    for path, result in zip(input_paths, results):
+        if stats is not None:
+            result, stats[path] = result
+        if result:
+            errors[path] = result
+    return errors
+
+
+def find_sources(path: str) -> typing.Tuple[str, typing.List[str]]:
+    """
+    Args:
+        path (str): a ".jack" file or a directory of them.
+
+    Returns:
+        typing.Tuple[str, typing.List[str]]: the directory the build's
+        manifest belongs in, and the sorted paths of the ".jack" files.
+
+    Raises:
+        FileNotFoundError: if the path does not exist.
+    """
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    if os.path.isdir(path):
+        build_directory = path
+        input_paths = [os.path.join(path, filename)
+                       for filename in sorted(os.listdir(path))]
+    else:
+        build_directory = os.path.dirname(path)
+        input_paths = [path]
+    return build_directory, [
+        input_path for input_path in input_paths
+        if os.path.splitext(input_path)[1].lower() == ".jack"]
+
+
+def build(input_paths: typing.List[str], cache: BuildCache, jobs: int = 1,
+          optimizations: typing.Collection[str] = (), force: bool = False,
+          stats: typing.Optional[typing.Dict[str, "CompilerStats"]] = None,
+          output_format: str = "text"
+          ) -> typing.Tuple[typing.List[str], typing.Dict[str, str]]:
+    """Compiles the files that are not up to date and updates the cache.
+    Inlining and dead code elimination look at the whole program, so with
+    them any stale file makes every file stale.
+
+    Args:
+        input_paths (typing.List[str]): paths of every ".jack" file of the
+        build.
+        cache (BuildCache): the cache of the build's directory.
+        jobs (int): number of worker processes, 0 for one per CPU.
+        optimizations (typing.Collection[str]): the optimizations to apply.
+        force (bool): recompile the files even if they are up to date.
+        stats (typing.Dict[str, CompilerStats]): if given, receives the
+        statistics of every compiled file, by path.
+        output_format (str): the encoding of the output.
+
+    Returns:
+        typing.Tuple[typing.List[str], typing.Dict[str, str]]: the files that
+        were compiled, and the error of every one that failed.
+    """
+    scan_errors = cache.scan(input_paths)
+    stale_files = [input_path for input_path in input_paths
+                   if force or input_path in scan_errors
+                   or not cache.is_fresh(input_path)]
+    whole_program = not WHOLE_PROGRAM_OPTIMIZATIONS.isdisjoint(optimizations)
+    if whole_program and stale_files:
+        stale_files = list(input_paths)
+    errors = compile_paths(
+        [input_path for input_path in stale_files
+         if input_path not in scan_errors],
+        jobs, optimizations, stats, cache.index, output_format)
+    errors = {input_path: scan_errors.get(input_path) or errors[input_path]
+              for input_path in stale_files
+              if input_path in scan_errors or input_path in errors}
+    if whole_program and stale_files and not errors:
+        output_paths = [
+            os.path.splitext(input_path)[0] + OUTPUT_EXTENSIONS[output_format]
+            for input_path in input_paths]
+        if "inline" in optimizations:
+            from Inliner import Inliner
+            Inliner(create_passes(optimizations)).inline_paths(output_paths)
+        if "dce" in optimizations:
+            from DeadCodeEliminator import DeadCodeEliminator
+            DeadCodeEliminator().eliminate_paths(output_paths)
+    for input_path in stale_files:
+        if input_path in errors:
+            cache.forget(input_path)
+        else:
+            cache.record(input_path)
+    cache.save()
+    return stale_files, errors
+
+
+def summarize(input_paths: typing.List[str], stale_files: typing.List[str],
+              errors: typing.Dict[str, str]) -> str:
+    return f'{len(input_paths) - len(stale_files)} up to date, ' \
+        f'{len(stale_files) - len(errors)} compiled, {len(errors)} failed'
 
 
 if "__main__" == __name__:
@@ -37,20 +356,116 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: JackCompiler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
-    if os.path.isdir(argument_path):
-        files_to_assemble = [
-            os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+    parser = argparse.ArgumentParser(
+        prog="JackCompiler", usage="JackCompiler [options] <input path>")
+    parser.add_argument("path", nargs="?",
+                        help="a .jack file or a directory of them")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, metavar="N",
+        help="compile with N worker processes (0: one per CPU)")
+    parser.add_argument(
+        "--force", action="store_true",
+        help="recompile every file, even if it is up to date")
+    parser.add_argument(
+        "-O", "--optimize", action="store_true",
+        help="apply all optimizations")
+    parser.add_argument(
+        "--opt", action="append", default=[],
+        choices=OPTIMIZATIONS + OPT_IN_OPTIMIZATIONS, metavar="NAME",
+        help="apply a single optimization, one of: "
+        + ", ".join(OPTIMIZATIONS + OPT_IN_OPTIMIZATIONS)
+        + "; not included in -O: " + ", ".join(OPT_IN_OPTIMIZATIONS))
+    parser.add_argument(
+        "--format", choices=sorted(OUTPUT_FORMATS), default="text",
+        help="write textual .vm files, or compact binary .vmb files that "
+        "BinaryVMReader.py turns back into text (default: text)")
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="report per file and total timings and counts")
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="profile the build into PATH, as collapsed stacks if it ends in "
+        ".folded or .collapsed and as pstats data otherwise; implies -j 1")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="stay resident and recompile whenever a source file changes")
+    parser.add_argument(
+        "--serve", metavar="SOCKET",
+        help="stay resident and compile the paths requested over a Unix "
+        "socket, see CompileServer.py")
+    args = parser.parse_args()
+    if args.path is None and not args.serve:
+        parser.error("an input path is required")
+    optimizations = sorted(set(args.opt).union(
+        OPTIMIZATIONS if args.optimize else ()))
+    settings = ",".join(optimizations) + ";" + args.format
+    output_extension = OUTPUT_EXTENSIONS[args.format]
+    if args.serve:
+        from CompileServer import serve
+        caches: typing.Dict[str, BuildCache] = {}
+
+        def handle(request: dict) -> dict:
+            build_directory, input_paths = find_sources(request["path"])
+            if build_directory not in caches:
+                caches[build_directory] = BuildCache(
+                    os.path.join(build_directory, MANIFEST_NAME), settings,
+                    output_extension)
+            stale_files, errors = build(
+                input_paths, caches[build_directory], args.jobs,
+                optimizations, request.get("force", False),
+                output_format=args.format)
+            return {"up_to_date": len(input_paths) - len(stale_files),
+                    "compiled": [path for path in stale_files
+                                 if path not in errors],
+                    "errors": errors}
+        try:
+            serve(args.serve, handle)
+        except FileExistsError as error:
+            parser.error(str(error))
+        sys.exit()
+    try:
+        build_directory, files_to_assemble = find_sources(args.path)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+    cache = BuildCache(os.path.join(build_directory, MANIFEST_NAME), settings,
+                       output_extension)
+    if args.watch:
+        from CompileServer import watch
+
+        def rebuild(force: bool = False) -> None:
+            # files may have been added or removed since the last build
+            try:
+                _, input_paths = find_sources(args.path)
+            except FileNotFoundError as error:
+                print(error, file=sys.stderr, flush=True)
+                return
+            stale_files, errors = build(input_paths, cache, args.jobs,
+                                        optimizations, force,
+                                        output_format=args.format)
+            print(summarize(input_paths, stale_files, errors), flush=True)
+            for error in errors.values():
+                print(error, file=sys.stderr, flush=True)
+        rebuild(args.force)
+        watch(build_directory, rebuild)
+        sys.exit()
+    file_stats = {} if args.stats else None
+    if args.profile:
+        # the profiler only sees the current process
+        from CompilerStats import profile
+        stale_files, errors = profile(functools.partial(
+            build, files_to_assemble, cache, 1, optimizations, args.force,
+            file_stats, args.format), args.profile)
     else:
-        files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".jack":
-            continue
-        output_path = filename + ".vm"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            compile_file(input_file, output_file)
+        stale_files, errors = build(files_to_assemble, cache, args.jobs,
+                                    optimizations, args.force, file_stats,
+                                    args.format)
+    if file_stats is not None:
+        from CompilerStats import CompilerStats
+        total = CompilerStats()
+        for stats in file_stats.values():
+            print(stats.format())
+            total.merge(stats)
+        print(total.format())
+    print(summarize(files_to_assemble, stale_files, errors))
+    if errors:
+        sys.exit("\n".join(errors.values()))
@@ -6,19 +6,11 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
+import io
+import mmap
 import re
-from enum import Enum
-
-END_COMMENT = ['//']
-COMMENT = ['/*', '*/']
-DOCUMENTATION = ['/**', '*/']
-COMMENT_REGEX= r'\/\*\*?.[^\/]*\n?\*\/|\/\*\*?.[^\*]*\n?\*\/|\/\/.*'
-
-# COMMENT_REGEX= r'\/\*\*?(?:.*\n?)*\*\/|\/\/.*'
-# STRING_REGEX = r'(?:".*)\/\/.*(?:")|(?:".*)\/\*\*?.[^\/]*\n?\*\/(?:")|(?:".*)\/\*\*?.[^\*]*\n?\*(?:")'
-STRING_CLOSER = r'\*\/'
-ALL_COMMENTS = set(END_COMMENT+COMMENT+DOCUMENTATION)
-
+import sys
+from enum import IntEnum
 
 ARITHMETIC_GROUPING =['(', ')']
 ARRAY_INDEXING= ['[' ,']']
@@ -26,11 +18,11 @@ STATEMENT_GROUPING=['{','}']
 LIST_SEPARATOR=[',']
 STATEMENT_TERMINATOR = [';']
 CLASS_MEMBERSHIP = ['.']
-OPERATORS = ['+','-','*','/','&amp;','|','~', '&lt;','&gt;','^','#',"="]
-BINARY_OPERATORS = ['+','-','*','/','<','>', '=']
-SYMBOLS = set(ARITHMETIC_GROUPING+ARRAY_INDEXING+STATEMENT_GROUPING+LIST_SEPARATOR+STATEMENT_TERMINATOR+
-              CLASS_MEMBERSHIP+OPERATORS+ ['<', '>', '&'])
-CLASS_NAMES = ["String"]
+OPERATORS = ['+','-','*','/','&','|','~','<','>','^','#',"="]
+BINARY_OPERATORS = frozenset(['+','-','*','/','&','|','<','>', '='])
+UNARY_OPERATORS = frozenset(['-', '~', '^', '#'])
+SYMBOLS = frozenset(ARITHMETIC_GROUPING+ARRAY_INDEXING+STATEMENT_GROUPING+LIST_SEPARATOR+STATEMENT_TERMINATOR+
+                    CLASS_MEMBERSHIP+OPERATORS)
 
 PROGRAM_COMPONENTS = ['class', 'constructor', 'method', 'function']
 PRIMITIVE_TYPES = ['int', 'boolean', 'char', 'void']
@@ -39,11 +31,72 @@ STATEMENTS= ['let', 'do', 'if', 'else', 'while', 'return']
 CONSTANT_VALUES = ['true', 'false', 'null']
 OBJECTIVE_REFERENCE = ['this']
 
-KEYWORD = set(PROGRAM_COMPONENTS+PRIMITIVE_TYPES+VARIABLE_DECLARATIONS+STATEMENTS+CONSTANT_VALUES+OBJECTIVE_REFERENCE)
+KEYWORD = frozenset(PROGRAM_COMPONENTS+PRIMITIVE_TYPES+VARIABLE_DECLARATIONS+STATEMENTS+CONSTANT_VALUES+OBJECTIVE_REFERENCE)
+SUBROUTINE_KEYWORDS = frozenset(['constructor', 'method', 'function'])
+CLASS_VAR_KEYWORDS = frozenset(['static', 'field'])
+STATEMENT_KEYWORDS = frozenset(['let', 'do', 'if', 'while', 'return'])
+KEYWORD_CONSTANTS = frozenset(CONSTANT_VALUES)
+
+XML_ESCAPES = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+
+# A single master pattern drives the scanner: every alternative is a named
+# group, so the kind of each lexeme is known from the match itself. Comments
+# and whitespace are matched (and dropped) here, never reaching the parser,
+# and any other character is matched as unknown and reported. Names are ASCII,
+# as they are when the pattern runs over bytes.
+TOKEN_REGEX = re.compile(r'''
+      (?P<whitespace>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<stringConstant>"[^"\n]*")
+    | (?P<word>\w+)
+    | (?P<symbol>[{}()\[\].,;+\-*/&|<>=~^\#])
+    | (?P<unknown>.)
+''', re.VERBOSE | re.DOTALL | re.ASCII)
+# the same pattern over bytes, for sources that are mapped rather than read
+TOKEN_BYTES_REGEX = re.compile(TOKEN_REGEX.pattern.encode(),
+                               re.VERBOSE | re.DOTALL)
+SKIPPED_GROUPS = frozenset(['whitespace', 'comment'])
+
+
+class CompilationError(BaseException):
+    pass
+
+
+def unknown_character(character: str, line: int) -> CompilationError:
+    """
+    Args:
+        character (str): a character that starts no lexeme.
+        line (int): the number of the line it is on, starting at 1.
 
-OPERATORS_REGEX = r'\+|\-|\*|\/'
-PARENTHESIS_REGEX = r'\(.[^)(]*\)'
-REGEX = r'\w+|\".[^"]*\"|\/\/|\*\/|\/\*|-|\*\/|&|\||~|<|>|\(|\)|\[|\]|\{|}|,|;|=|\.|\+|-|\*|\/|&|\||~|<|>|\^|#|\n'
+    Returns:
+        CompilationError: the error reporting it.
+    """
+    if character == '"':
+        return CompilationError(f'line {line}: unterminated string constant')
+    return CompilationError(f'line {line}: unexpected character '
+                            f'{character!r}')
+
+
+class TokenKind(IntEnum):
+    KEYWORD = 0
+    SYMBOL = 1
+    IDENTIFIER = 2
+    INT_CONST = 3
+    STRING_CONST = 4
+
+
+# the tag of each kind in the XML output of the analyzer
+KIND_TAGS = {
+    TokenKind.KEYWORD: "keyword",
+    TokenKind.SYMBOL: "symbol",
+    TokenKind.IDENTIFIER: "identifier",
+    TokenKind.INT_CONST: "integerConstant",
+    TokenKind.STRING_CONST: "stringConstant",
+}
+GROUP_KINDS = {
+    "symbol": TokenKind.SYMBOL,
+    "stringConstant": TokenKind.STRING_CONST,
+}
 
 
 class JackTokenizer:
@@ -130,47 +183,110 @@ class JackTokenizer:
     Note that ^, # correspond to shiftleft and shiftright, respectively.
     """
 
-    def __init__(self, input_stream: typing.TextIO) -> None:
+    def __init__(self, input_stream: typing.Union[typing.TextIO,
+                                                  typing.BinaryIO]) -> None:
         """Opens the input stream and gets ready to tokenize it.
 
         Args:
-            input_stream (typing.TextIO): input stream.
+            input_stream: a text stream, or a binary stream which is then
+            memory mapped where possible and tokenized without decoding it
+            as a whole.
         """
-        # Your code goes here!
-        # A good place to start is to read all the lines of the input:
         self.cur_token = None
-        self.text = re.findall(REGEX, input_stream.read())
-        self.comment = Comment.NOT_COMMENT
-        # comment_clean_input = self.comment_cleaner(input_stream)
-        # self.input_lines = [line for line in comment_clean_input.splitlines() if line != '']
-        pass
-
-    def comment_cleaner(self, input_stream):
-        comment_clean_input = input_stream.read()
-        comment_clean_input = re.sub(COMMENT_REGEX, "", comment_clean_input)
-        # string_clean_input = re.sub(STRING_REGEX, '', comment_clean_input)
-        # comments_to_clean= re.findall(COMMENT_REGEX, string_clean_input)
-        # for comment in comments_to_clean:
-        #     comment_clean_input= comment_clean_input.replace(comment, "")
-        return comment_clean_input
+        if isinstance(input_stream, (io.RawIOBase, io.BufferedIOBase)):
+            self._lexemes = self.scan_bytes(self.map_source(input_stream))
+        else:
+            self._lexemes = self.scan(input_stream.read())
+        self._lookahead = next(self._lexemes, None)
+
+    @staticmethod
+    def map_source(input_stream: typing.BinaryIO
+                   ) -> typing.Union[mmap.mmap, bytes]:
+        """
+        Args:
+            input_stream (typing.BinaryIO): a binary input stream.
+
+        Returns:
+            typing.Union[mmap.mmap, bytes]: a read-only mapping of the
+            stream's file, or the stream's content if it cannot be mapped.
+        """
+        try:
+            return mmap.mmap(input_stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            # in-memory streams and empty files cannot be mapped
+            return input_stream.read()
+
+    @staticmethod
+    def scan(text: str) -> typing.Iterator[typing.Tuple[str, str]]:
+        """Lazily splits the source text into (group, lexeme) pairs, skipping
+        whitespace and comments.
+
+        Args:
+            text (str): the source text.
+
+        Returns:
+            typing.Iterator[typing.Tuple[str, str]]: the scanned lexemes.
+
+        Raises:
+            CompilationError: on a character that starts no lexeme, once the
+            scan reaches it.
+        """
+        for match in TOKEN_REGEX.finditer(text):
+            group = match.lastgroup
+            if group == "unknown":
+                raise unknown_character(
+                    match.group(), text.count("\n", 0, match.start()) + 1)
+            if group not in SKIPPED_GROUPS:
+                yield group, match.group()
+
+    @staticmethod
+    def scan_bytes(data: typing.Union[mmap.mmap, bytes]
+                   ) -> typing.Iterator[typing.Tuple[str, str]]:
+        """Like scan(), but over the raw bytes of a source. Only string
+        constants are decoded where they occur; every other lexeme is ASCII
+        and is decoded once, the first time it is seen.
+
+        Args:
+            data (typing.Union[mmap.mmap, bytes]): the source bytes.
+
+        Returns:
+            typing.Iterator[typing.Tuple[str, str]]: the scanned lexemes.
+
+        Raises:
+            CompilationError: like scan().
+        """
+        texts: typing.Dict[bytes, str] = {}
+        for match in TOKEN_BYTES_REGEX.finditer(data):
+            group = match.lastgroup
+            if group == "unknown":
+                # the byte may start an encoded character that is not ASCII
+                start = match.start()
+                raise unknown_character(
+                    data[start:start + 4].decode(errors="replace")[0],
+                    data[:start].count(b"\n") + 1)
+            if group in SKIPPED_GROUPS:
+                continue
+            lexeme = match.group()
+            if group == "stringConstant":
+                yield group, lexeme.decode()
+                continue
+            text = texts.get(lexeme)
+            if text is None:
+                text = texts[lexeme] = lexeme.decode("ascii")
+            yield group, text
 
     def token_generator(self):
         if self.has_more_tokens():
             yield self.advance()
         yield None
 
-
-    def process_token(self, cur_token_text, token_type):
-        if token_type == "symbol":
-            return self.symbol(cur_token_text)
-        elif token_type == "keyword":
-            return self.keyword(cur_token_text)
-        elif token_type == "stringConstant":
+    def process_token(self, cur_token_text, token_type: TokenKind):
+        if token_type is TokenKind.STRING_CONST:
             return self.string_val(cur_token_text)
-        elif token_type == "integerConstant":
+        elif token_type is TokenKind.INT_CONST:
             return self.int_val(cur_token_text)
-        elif token_type == "identifier":
-            return self.identifier(cur_token_text)
+        # names and symbols recur constantly, so they share one string each
+        return sys.intern(cur_token_text)
 
     def has_more_tokens(self) -> bool:
         """Do we have more tokens in the input?
@@ -178,58 +294,38 @@ class JackTokenizer:
         Returns:
             bool: True if there are more tokens, False otherwise.
         """
-        if not self.text:
-            return False
-        return True
-
+        return self._lookahead is not None
 
     def advance(self):
         """Gets the next token from the input and makes it the current token.
         This method should be called if has_more_tokens() is true.
         Initially there is no current token.
         """
-        if self.has_more_tokens():
-            cur_token_text = self.text.pop(0)
-            if self.comment == Comment.NOT_COMMENT and cur_token_text in ["/*", "/**"]:
-                self.comment = Comment.CLOSED_COMMENT
-                return self.advance()
-            elif self.comment == Comment.CLOSED_COMMENT and cur_token_text == "*/":
-                self.comment = Comment.NOT_COMMENT
-                return self.advance()
-            elif self.comment == Comment.NOT_COMMENT and cur_token_text == "//":
-                self.comment = Comment.OPEN_COMMENT
-                return self.advance()
-            elif self.comment == Comment.OPEN_COMMENT and cur_token_text == "\n":
-                self.comment = Comment.NOT_COMMENT
-                return self.advance()
-            elif self.comment != Comment.NOT_COMMENT or cur_token_text == "\n":
-                return self.advance()
-            else:
-                token_type = self.token_type(cur_token_text)
-                cur_token_text = self.process_token(cur_token_text, token_type)
-                return Token(cur_token_text, token_type)
-        return None
-
-
-    def token_type(self, token_text) -> str:
+        if self._lookahead is None:
+            return None
+        group, cur_token_text = self._lookahead
+        self._lookahead = next(self._lexemes, None)
+        token_type = self.token_type(cur_token_text) if group == "word" \
+            else GROUP_KINDS[group]
+        cur_token_text = self.process_token(cur_token_text, token_type)
+        self.cur_token = Token(cur_token_text, token_type)
+        return self.cur_token
+
+    def token_type(self, token_text) -> TokenKind:
         """
         Returns:
-            str: the type of the current token, can be
-            "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST"
+            TokenKind: the type of the current token, can be
+            KEYWORD, SYMBOL, IDENTIFIER, INT_CONST, STRING_CONST
         """
-        if token_text in SYMBOLS or token_text in CLASS_NAMES:
-            return "symbol"
+        if token_text in SYMBOLS:
+            return TokenKind.SYMBOL
         elif token_text in KEYWORD:
-            return "keyword"
+            return TokenKind.KEYWORD
         elif token_text[0] == '"' and token_text[-1] == '"':
-            return "stringConstant"
-        else:
-            try:
-                int(token_text)
-                return "integerConstant"
-            except ValueError:
-                return "identifier"
-
+            return TokenKind.STRING_CONST
+        elif token_text.isdigit():
+            return TokenKind.INT_CONST
+        return TokenKind.IDENTIFIER
 
     def keyword(self,cur_token_text) -> str:
         """
@@ -251,14 +347,7 @@ class JackTokenizer:
             symbol: '{' | '}' | '(' | ')' | '[' | ']' | '.' | ',' | ';' | '+' |
               '-' | '*' | '/' | '&' | '|' | '<' | '>' | '=' | '~' | '^' | '#'
         """
-        if cur_token_text == "<":
-            return "&lt;"
-        elif cur_token_text == ">":
-            return "&gt;"
-        elif cur_token_text == "&":
-            return "&amp;"
-        else:
-            return cur_token_text
+        return cur_token_text
 
     def identifier(self,cur_token_text) -> str:
         """
@@ -297,20 +386,20 @@ class JackTokenizer:
 
 
 class Token:
-    def __init__(self, text: str, token_type: str) -> None:
+    __slots__ = ('text', 'kind')
+
+    def __init__(self, text: str, kind: TokenKind) -> None:
         self.text = text
-        self.type = token_type
+        self.kind = kind
 
-    def set_type(self, token_type):
-        self.type = token_type
+    def set_kind(self, kind: TokenKind):
+        self.kind = kind
 
     def set_text(self, text):
         self.text = text
 
     def token_string(self) -> str:
-        return f'<{self.type}> {self.text} </{self.type}>\n'
-
-class Comment(Enum):
-    NOT_COMMENT = 0
-    CLOSED_COMMENT = 1
-    OPEN_COMMENT = 2
+        tag = KIND_TAGS[self.kind]
+        text = XML_ESCAPES.get(self.text, self.text) \
+            if self.kind is TokenKind.SYMBOL else self.text
+        return f'<{tag}> {text} </{tag}>\n'
@@ -0,0 +1,151 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from IntermediateCode import Opcode, Segment, Subroutine
+
+
+class LocalAllocator:
+    """Packs the local variables of a subroutine whose lifetimes do not
+    overlap into shared "local" slots, which shrinks the number of locals the
+    function declares and so the "push constant 0" commands its every call
+    starts with.
+
+    A variable is live between a write to it and the reads that may see the
+    value written. Two variables interfere if one is written while the other
+    is live, and interfering variables keep separate slots. The VM clears
+    every slot on entry, so the variables read before they are written on
+    some path are all live from the start, and interfere with each other
+    and with everything written while they still are.
+    """
+
+    def allocate(self, subroutine: Subroutine) -> Subroutine:
+        """
+        Args:
+            subroutine (Subroutine): the instructions of a function.
+
+        Returns:
+            Subroutine: the function with its locals renumbered into as few
+            slots as the lifetimes allow.
+        """
+        instructions = list(subroutine)
+        if not instructions:
+            return subroutine
+        live_in, live_out = self.liveness(instructions)
+        interference: typing.Dict[int, int] = {}
+        # copies from one local to another, which may share a slot
+        copies: typing.Dict[int, typing.Set[int]] = {}
+        variables = 0
+        for position, (opcode, segment, index, _) in enumerate(instructions):
+            if segment != Segment.LOCAL:
+                continue
+            variables |= 1 << index
+            if opcode != Opcode.POP:
+                continue
+            written = live_out[position] & ~(1 << index)
+            interference[index] = interference.get(index, 0) | written
+            for other in self.members(written):
+                interference[other] = interference.get(other, 0) | 1 << index
+            previous = instructions[position - 1] if position else None
+            if previous and previous[0] == Opcode.PUSH and \
+                    previous[1] == Segment.LOCAL and previous[2] != index:
+                copies.setdefault(index, set()).add(previous[2])
+                copies.setdefault(previous[2], set()).add(index)
+        for index in self.members(live_in[0]):
+            interference[index] = interference.get(index, 0) | \
+                live_in[0] & ~(1 << index)
+        slots = self.assign_slots(self.members(variables), interference,
+                                  copies)
+        n_locals = max(slots.values(), default=-1) + 1
+        if n_locals == subroutine.n_locals and all(
+                slot == index for index, slot in slots.items()):
+            return subroutine
+        return Subroutine(
+            subroutine.name, n_locals,
+            [(opcode, segment, slots[index], name)
+             if segment == Segment.LOCAL else (opcode, segment, index, name)
+             for opcode, segment, index, name in instructions])
+
+    @staticmethod
+    def members(variables: int) -> typing.List[int]:
+        """
+        Returns:
+            typing.List[int]: the indices of the bits set in a bit set.
+        """
+        return [index for index in range(variables.bit_length())
+                if variables >> index & 1]
+
+    @staticmethod
+    def liveness(instructions: typing.List[tuple]
+                 ) -> typing.Tuple[typing.List[int], typing.List[int]]:
+        """Computes the locals live before and after every instruction, as
+        bit sets over their indices.
+        """
+        labels = {name: position
+                  for position, (opcode, _, _, name) in enumerate(instructions)
+                  if opcode == Opcode.LABEL}
+        successors: typing.List[typing.Tuple[int, ...]] = []
+        uses: typing.List[int] = []
+        definitions: typing.List[int] = []
+        end = len(instructions)
+        for position, (opcode, segment, index, name) in enumerate(
+                instructions):
+            if opcode == Opcode.GOTO:
+                successors.append((labels[name],))
+            elif opcode == Opcode.IF_GOTO:
+                successors.append((position + 1, labels[name]))
+            elif opcode == Opcode.RETURN:
+                successors.append(())
+            else:
+                successors.append((position + 1,))
+            local = 1 << index if segment == Segment.LOCAL else 0
+            uses.append(local if opcode == Opcode.PUSH else 0)
+            definitions.append(local if opcode == Opcode.POP else 0)
+        live_in = [0] * (end + 1)
+        live_out = [0] * end
+        changed = True
+        while changed:
+            changed = False
+            for position in range(end - 1, -1, -1):
+                out = 0
+                for successor in successors[position]:
+                    out |= live_in[successor]
+                live_out[position] = out
+                live = uses[position] | out & ~definitions[position]
+                if live != live_in[position]:
+                    live_in[position] = live
+                    changed = True
+        return live_in, live_out
+
+    @staticmethod
+    def assign_slots(variables: typing.List[int],
+                     interference: typing.Dict[int, int],
+                     copies: typing.Dict[int, typing.Set[int]]
+                     ) -> typing.Dict[int, int]:
+        """Gives every variable the lowest slot none of the variables it
+        interferes with holds, preferring the slot of a variable it is copied
+        to or from, so that the copy becomes a no-op.
+
+        Returns:
+            typing.Dict[int, int]: the slot of every variable.
+        """
+        slots: typing.Dict[int, int] = {}
+        for index in variables:
+            taken = {slots[other]
+                     for other in LocalAllocator.members(
+                         interference.get(index, 0)) if other in slots}
+            preferred = [slots[other] for other in sorted(
+                copies.get(index, ())) if other in slots
+                and slots[other] not in taken]
+            if preferred:
+                slots[index] = preferred[0]
+                continue
+            slot = 0
+            while slot in taken:
+                slot += 1
+            slots[index] = slot
+        return slots
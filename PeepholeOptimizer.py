@@ -0,0 +1,163 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from IntermediateCode import COMPARISONS, Instruction, Opcode, Segment, \
+    Subroutine
+
+# commands that cancel out when they appear twice in a row
+INVOLUTIONS = frozenset([Opcode.NOT, Opcode.NEG])
+# binary commands for which pushing 0 as the second operand is a no-op
+ZERO_IDENTITIES = frozenset([Opcode.ADD, Opcode.SUB, Opcode.OR])
+# segments that "pop pointer 1" leaves untouched, so a push from them may be
+# moved past it
+STABLE_SEGMENTS = frozenset([Segment.CONSTANT, Segment.LOCAL,
+                             Segment.ARGUMENT, Segment.STATIC, Segment.THIS])
+PUSH_ZERO = (Opcode.PUSH, Segment.CONSTANT, 0, None)
+NOT = (Opcode.NOT, Segment.NONE, 0, None)
+ARRAY_STORE = [(Opcode.POP, Segment.TEMP, 0, None),
+               (Opcode.POP, Segment.POINTER, 1, None),
+               (Opcode.PUSH, Segment.TEMP, 0, None),
+               (Opcode.POP, Segment.THAT, 0, None)]
+JUMPS = frozenset([Opcode.GOTO, Opcode.RETURN])
+JUMP_TARGETS = frozenset([Opcode.GOTO, Opcode.IF_GOTO])
+
+
+class PeepholeOptimizer:
+    """Rewrites short windows of VM commands into shorter equivalents.
+
+    Instructions are consumed one at a time onto an output stack, and after
+    each one the top of the stack is matched against the rewrite rules until
+    none applies, so a rewrite can enable further rewrites below it. Each
+    subroutine is optimized on its own, since jumps are resolved within it.
+    """
+
+    def __init__(self) -> None:
+        # the rules that may apply when an instruction of each opcode is on
+        # top of the stack
+        self.rules: typing.Dict[int, typing.Callable[
+            [typing.List[Instruction]], bool]] = {
+            Opcode.NOT: self.reduce_involution,
+            Opcode.NEG: self.reduce_involution,
+            Opcode.ADD: self.reduce_zero_identity,
+            Opcode.SUB: self.reduce_zero_identity,
+            Opcode.OR: self.reduce_zero_identity,
+            Opcode.POP: self.reduce_pop,
+            Opcode.IF_GOTO: self.reduce_if_goto,
+            Opcode.LABEL: self.reduce_label,
+        }
+
+    def optimize(self, subroutine: Subroutine) -> Subroutine:
+        """
+        Args:
+            subroutine (Subroutine): the instructions of a function.
+
+        Returns:
+            Subroutine: the optimized function.
+        """
+        instructions = list(subroutine)
+        while True:
+            optimized = self.remove_unused_labels(self.rewrite(instructions))
+            if len(optimized) == len(instructions):
+                return Subroutine(subroutine.name, subroutine.n_locals,
+                                  optimized)
+            instructions = optimized
+
+    def rewrite(self, instructions: typing.List[Instruction]
+                ) -> typing.List[Instruction]:
+        output: typing.List[Instruction] = []
+        rules = self.rules
+        reachable = True
+        for instruction in instructions:
+            opcode = instruction[0]
+            if opcode == Opcode.LABEL:
+                reachable = True
+            elif not reachable:
+                continue
+            output.append(instruction)
+            rule = rules.get(opcode)
+            while rule is not None and len(output) > 1 and rule(output):
+                rule = rules.get(output[-1][0]) if output else None
+            if output and output[-1][0] in JUMPS:
+                reachable = False
+        return output
+
+    # Each rule looks at the top of the stack, which ends with an instruction
+    # of the opcode it is registered for, and returns True if it rewrote it.
+
+    @staticmethod
+    def reduce_involution(output: typing.List[Instruction]) -> bool:
+        # not / not, neg / neg
+        if output[-2] == output[-1]:
+            del output[-2:]
+            return True
+        return False
+
+    @staticmethod
+    def reduce_zero_identity(output: typing.List[Instruction]) -> bool:
+        # push constant 0 / add, sub or or
+        if output[-2] == PUSH_ZERO:
+            del output[-2:]
+            return True
+        return False
+
+    @staticmethod
+    def reduce_pop(output: typing.List[Instruction]) -> bool:
+        last = output[-1]
+        previous = output[-2]
+        # push x / pop x
+        if previous[0] == Opcode.PUSH and previous[1:] == last[1:]:
+            del output[-2:]
+            return True
+        # push x / pop temp 0 / pop pointer 1 / push temp 0 / pop that 0
+        if last == ARRAY_STORE[-1] and output[-4:] == ARRAY_STORE and \
+                len(output) >= 5:
+            pushed = output[-5]
+            if pushed[0] == Opcode.PUSH and pushed[1] in STABLE_SEGMENTS:
+                output[-5:] = [ARRAY_STORE[1], pushed, ARRAY_STORE[3]]
+                return True
+        return False
+
+    @staticmethod
+    def reduce_if_goto(output: typing.List[Instruction]) -> bool:
+        previous = output[-2]
+        # push constant 0 / if-goto: never taken
+        if previous == PUSH_ZERO:
+            del output[-2:]
+            return True
+        # push constant 0 / not / if-goto: always taken
+        if previous == NOT and output[-3:-2] == [PUSH_ZERO]:
+            output[-3:] = [(Opcode.GOTO, Segment.NONE, 0, output[-1][3])]
+            return True
+        return False
+
+    @staticmethod
+    def reduce_label(output: typing.List[Instruction]) -> bool:
+        label = output[-1][3]
+        previous = output[-2]
+        if previous[0] == Opcode.GOTO:
+            # goto L / label L
+            if previous[3] == label:
+                del output[-2]
+                return True
+            # comparison / not / if-goto A / goto B / label A  ->
+            # comparison / if-goto B / label A, which only holds when the
+            # condition is exactly true or false, unlike "not 5"
+            if output[-4:-2] == \
+                    [NOT, (Opcode.IF_GOTO, Segment.NONE, 0, label)] and \
+                    len(output) >= 5 and output[-5][0] in COMPARISONS:
+                output[-4:] = [(Opcode.IF_GOTO,) + previous[1:], output[-1]]
+                return True
+        return False
+
+    def remove_unused_labels(self, instructions: typing.List[Instruction]
+                             ) -> typing.List[Instruction]:
+        targets = {name for opcode, _, _, name in instructions
+                   if opcode in JUMP_TARGETS}
+        return [instruction for instruction in instructions
+                if instruction[0] != Opcode.LABEL
+                or instruction[3] in targets]
@@ -6,9 +6,21 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
-import pandas as pd
 
 KINDS = ['VAR', 'ARG', 'STATIC', 'FIELD']
+CLASS_KINDS = frozenset(['STATIC', 'FIELD'])
+
+
+class Symbol:
+    """A single symbol table entry: the type, kind and running index of a
+    named identifier.
+    """
+    __slots__ = ('type', 'kind', 'index')
+
+    def __init__(self, type: str, kind: str, index: int) -> None:
+        self.type = type
+        self.kind = kind
+        self.index = index
 
 
 class SymbolTable:
@@ -19,17 +31,17 @@ class SymbolTable:
 
     def __init__(self) -> None:
         """Creates a new empty symbol table."""
-        # Your code goes here!
-        self.table = pd.DataFrame({'Type': [], 'Kind': [], '#': []})
-        # shira gelbstein has changed the code
-        pass
+        self.class_scope: typing.Dict[str, Symbol] = {}
+        self.subroutine_scope: typing.Dict[str, Symbol] = {}
+        self.counts = dict.fromkeys(KINDS, 0)
 
     def start_subroutine(self) -> None:
         """Starts a new subroutine scope (i.e., resets the subroutine's 
         symbol table).
         """
-        self.table = self.table[~self.table['Kind'].isin(['ARG', 'VAR'])]
-
+        self.subroutine_scope = {}
+        self.counts['ARG'] = 0
+        self.counts['VAR'] = 0
 
     def define(self, name: str, type: str, kind: str) -> None:
         """Defines a new identifier of a given name, type and kind and assigns 
@@ -42,8 +54,11 @@ class SymbolTable:
             kind (str): the kind of the new identifier, can be:
             "STATIC", "FIELD", "ARG", "VAR".
         """
-        count = self.var_count(kind)
-        self.table = self.table.append(pd.DataFrame({'Type': [type], 'Kind': [kind], '#': [count]}, index=[name]))
+        index = self.counts[kind]
+        self.counts[kind] = index + 1
+        scope = self.class_scope if kind in CLASS_KINDS \
+            else self.subroutine_scope
+        scope[name] = Symbol(type, kind, index)
 
     def var_count(self, kind: str) -> int:
         """
@@ -54,7 +69,24 @@ class SymbolTable:
             int: the number of variables of the given kind already defined in 
             the current scope.
         """
-        return int((self.table['Kind'] == kind).sum())
+        return self.counts[kind]
+
+    def lookup(self, name: str) -> typing.Optional[Symbol]:
+        """
+        Args:
+            name (str): name of an identifier.
+
+        Returns:
+            Symbol: the entry of the named identifier, searching the subroutine
+            scope before the class scope, or None if it is unknown.
+        """
+        symbol = self.subroutine_scope.get(name)
+        if symbol is None:
+            return self.class_scope.get(name)
+        return symbol
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.subroutine_scope or name in self.class_scope
 
     def kind_of(self, name: str) -> str:
         """
@@ -65,7 +97,8 @@ class SymbolTable:
             str: the kind of the named identifier in the current scope, or None
             if the identifier is unknown in the current scope.
         """
-        return self.table.loc[name, "Kind"]
+        symbol = self.lookup(name)
+        return symbol.kind if symbol else None
 
     def type_of(self, name: str) -> str:
         """
@@ -73,9 +106,11 @@ class SymbolTable:
             name (str):  name of an identifier.
 
         Returns:
-            str: the type of the named identifier in the current scope.
+            str: the type of the named identifier in the current scope, or None
+            if the identifier is unknown in the current scope.
         """
-        return self.table.loc[name, 'Type']
+        symbol = self.lookup(name)
+        return symbol.type if symbol else None
 
     def index_of(self, name: str) -> int:
         """
@@ -83,6 +118,8 @@ class SymbolTable:
             name (str):  name of an identifier.
 
         Returns:
-            int: the index assigned to the named identifier.
+            int: the index assigned to the named identifier, or None if the
+            identifier is unknown in the current scope.
         """
-        return int(self.table.loc[name, '#'])
+        symbol = self.lookup(name)
+        return symbol.index if symbol else None
@@ -0,0 +1,44 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Reads and rewrites compiled files in either output format, for the passes
+that work on the whole program once every unit is compiled.
+"""
+import os
+import typing
+from BinaryVMReader import read_path
+from BinaryVMWriter import BINARY_EXTENSION, BinaryVMWriter
+from IntermediateCode import parse
+
+
+def read_commands(output_path: str) -> typing.List[str]:
+    """
+    Args:
+        output_path (str): path of a ".vm" or ".vmb" file.
+
+    Returns:
+        typing.List[str]: its VM commands, each ending in a newline.
+    """
+    if output_path.endswith(BINARY_EXTENSION):
+        return read_path(output_path)
+    with open(output_path, 'r') as output_file:
+        return output_file.readlines()
+
+
+def write_commands(output_path: str, commands: typing.List[str]) -> None:
+    """Atomically replaces a ".vm" or ".vmb" file with the given commands."""
+    temp_path = output_path + ".tmp"
+    if output_path.endswith(BINARY_EXTENSION):
+        with open(temp_path, 'wb') as output_file:
+            writer = BinaryVMWriter(output_file)
+            for subroutine in parse(commands):
+                writer.write_subroutine(subroutine)
+            writer.flush()
+    else:
+        with open(temp_path, 'w') as output_file:
+            output_file.writelines(commands)
+    os.replace(temp_path, output_path)
@@ -5,94 +5,93 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import io
 import typing
+from IntermediateCode import COMMAND_NAMES, SEGMENT_NAMES, Opcode, Pass, \
+    Subroutine
+
+# number of buffered commands after which the buffer is flushed, checked at
+# subroutine boundaries so that output is written in whole subroutines
+FLUSH_THRESHOLD = 4096
 
 
 class VMWriter:
     """
     Writes VM commands into a file. Encapsulates the VM command syntax.
+    Subroutines arrive in their intermediate form and are serialized into a
+    buffer, which is written to the output stream in large chunks; call
+    flush() once the last subroutine was written.
     """
-    COMMAND_DICT ={'+':'add', '-': 'sub', '=': 'eq', '>': 'gt', '<':'le', '&':'and', '|': 'or', '~': 'not', '*':'mult'}
-
-    def __init__(self, output_stream: typing.TextIO) -> None:
-        """Creates a new file and prepares it for writing VM commands."""
-        # Your code goes here!
-        # Note that you can write to output_stream like so:
-        # output_stream.write("Hello world! \n")
-        self.output_stream = output_stream
-
-    def write_push(self, segment: str, index: int) -> None:
-        """Writes a VM push command.
-
-        Args:
-            segment (str): the segment to push to, can be "CONST", "ARG", 
-            "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP"
-            index (int): the index to push to.
-        """
-        self.output_stream.write(f'push {segment} {index}\n')
-
-    def write_pop(self, segment: str, index: int) -> None:
-        """Writes a VM pop command.
-
-        Args:
-            segment (str): the segment to pop from, can be "CONST", "ARG", 
-            "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP".
-            index (int): the index to pop from.
-        """
-        self.output_stream.write(f'pop {segment} {index}\n')
-        pass
 
-    def write_arithmetic(self, command: str) -> None:
-        """Writes a VM arithmetic command.
+    def __init__(self, output_stream: typing.Union[typing.TextIO,
+                                                   typing.BinaryIO],
+                 flush_threshold: int = FLUSH_THRESHOLD,
+                 passes: typing.Sequence[Pass] = ()) -> None:
+        """Creates a new file and prepares it for writing VM commands.
 
         Args:
-            command (str): the command to write, can be "ADD", "SUB", "NEG", 
-            "EQ", "GT", "LT", "AND", "OR", "NOT", "SHIFTLEFT", "SHIFTRIGHT".
+            output_stream: a text stream, or a binary stream which then
+            receives the commands encoded as ASCII.
+            flush_threshold (int): number of buffered commands after which
+            the buffer is flushed.
+            passes (typing.Sequence[Pass]): rewrite every subroutine, in
+            order, before it is serialized.
         """
-        self.output_stream.write(f'{VMWriter.COMMAND_DICT[command]}\n')
-
-    def write_label(self, label: str) -> None:
-        """Writes a VM label command.
+        self.output_stream = output_stream
+        self.binary = isinstance(
+            output_stream, (io.RawIOBase, io.BufferedIOBase))
+        self.flush_threshold = flush_threshold
+        self.passes = passes
+        self.buffer: typing.List[str] = []
+
+    def flush(self) -> None:
+        """Writes all buffered commands to the output stream."""
+        if not self.buffer:
+            return
+        chunk = "".join(self.buffer)
+        self.buffer.clear()
+        self.output_stream.write(chunk.encode("ascii") if self.binary
+                                 else chunk)
+
+    def write_subroutine(self, subroutine: Subroutine) -> None:
+        """Writes a complete VM function.
 
         Args:
-            label (str): the label to write.
+            subroutine (Subroutine): the function's instructions.
         """
-        self.output_stream.write(f'label {label}\n')
+        for optimization in self.passes:
+            subroutine = optimization(subroutine)
+        self.emit(subroutine)
 
-    def write_goto(self, label: str) -> None:
-        """Writes a VM goto command.
+    def emit(self, subroutine: Subroutine) -> None:
+        """Serializes a function into the buffer.
 
         Args:
-            label (str): the label to go to.
+            subroutine (Subroutine): the function's final instructions.
         """
-        self.output_stream.write(f'goto {label}\n')
-
-    def write_if(self, label: str) -> None:
-        """Writes a VM if-goto command.
+        self.buffer.extend(self.serialize(subroutine))
+        if len(self.buffer) >= self.flush_threshold:
+            self.flush()
 
-        Args:
-            label (str): the label to go to.
+    @staticmethod
+    def serialize(subroutine: Subroutine) -> typing.List[str]:
         """
-        self.output_stream.write(f'if-goto {label}\n')
-
-    def write_call(self, name: str, n_args: int) -> None:
-        """Writes a VM call command.
-
         Args:
-            name (str): the name of the function to call.
-            n_args (int): the number of arguments the function receives.
-        """
-        self.output_stream.write(f'call {name} {n_args}\n')
-
-    def write_function(self, name: str, n_locals: int) -> None:
-        """Writes a VM function command.
+            subroutine (Subroutine): a function's instructions.
 
-        Args:
-            name (str): the name of the function.
-            n_locals (int): the number of local variables the function uses.
+        Returns:
+            typing.List[str]: the function's VM commands, each ending in a
+            newline.
         """
-        self.output_stream.write(f'function {name} {n_locals}\n')
-
-    def write_return(self) -> None:
-        """Writes a VM return command."""
-        self.output_stream.write(f'return\n')
+        commands = [f'function {subroutine.name} {subroutine.n_locals}\n']
+        for opcode, segment, operand, name in subroutine:
+            if segment:
+                commands.append(f'{COMMAND_NAMES[opcode]} '
+                                f'{SEGMENT_NAMES[segment]} {operand}\n')
+            elif opcode == Opcode.CALL:
+                commands.append(f'call {name} {operand}\n')
+            elif name is not None:
+                commands.append(f'{COMMAND_NAMES[opcode]} {name}\n')
+            else:
+                commands.append(f'{COMMAND_NAMES[opcode]}\n')
+        return commands
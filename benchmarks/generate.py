@@ -0,0 +1,190 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Generates a synthetic corpus of valid Jack classes for benchmarking the
+compiler. The same seed and parameters always produce the same corpus.
+
+    python3 benchmarks/generate.py <output directory> [options]
+"""
+import argparse
+import os
+import random
+import typing
+
+OPERATORS = ['+', '-', '*', '/', '&', '|']
+COMPARISONS = ['<', '>', '=']
+LOCALS = ['x0', 'x1', 'x2', 'x3']
+FIELDS = ['f0', 'f1', 'f2']
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'score', 'level', 'lives',
+         'game over', 'press any key']
+
+
+class CorpusGenerator:
+    """Generates Jack classes of a configurable size and shape."""
+
+    def __init__(self, seed: int = 0, subroutines: int = 10,
+                 statements: int = 20, depth: int = 3, strings: int = 2,
+                 arrays: int = 4, expression_length: int = 4) -> None:
+        """
+        Args:
+            seed (int): seed of the random generator.
+            subroutines (int): number of subroutines per class.
+            statements (int): number of top-level statements per subroutine.
+            depth (int): maximal nesting depth of if and while statements.
+            strings (int): number of string literals per subroutine.
+            arrays (int): number of array accesses per subroutine.
+            expression_length (int): maximal number of terms per expression.
+        """
+        self.random = random.Random(seed)
+        self.subroutines = subroutines
+        self.statements = statements
+        self.depth = depth
+        self.strings = strings
+        self.arrays = arrays
+        self.expression_length = expression_length
+
+    def generate_class(self, name: str) -> str:
+        """
+        Args:
+            name (str): the name of the class.
+
+        Returns:
+            str: the source of the class.
+        """
+        lines = [f'/** Generated benchmark class {name}. */',
+                 f'class {name} {{',
+                 f'    field int {", ".join(FIELDS)};',
+                 '    static int s0;',
+                 '',
+                 f'    constructor {name} new() {{']
+        lines += [f'        let {field} = {index};'
+                  for index, field in enumerate(FIELDS)]
+        lines += ['        return this;', '    }', '']
+        for index in range(self.subroutines):
+            lines += self.generate_subroutine(name, index)
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def generate_subroutine(self, class_name: str,
+                            index: int) -> typing.List[str]:
+        kind = 'method' if index % 2 else 'function'
+        self.in_method = kind == 'method'
+        self.class_name = class_name
+        self.index = index
+        lines = [f'    // subroutine {index}',
+                 f'    {kind} int sub{index}(int a, int b) {{',
+                 f'        var int {", ".join(LOCALS)};',
+                 '        var Array arr;',
+                 '        let arr = Array.new(16);']
+        body = [self.generate_statement(0)
+                for _ in range(self.statements)]
+        body += [f'do Output.printString("{self.random.choice(WORDS)}");'
+                 for _ in range(self.strings)]
+        body += [f'let arr[{self.generate_expression(1)}] = '
+                 f'{self.generate_expression(2)};'
+                 for _ in range(self.arrays)]
+        lines += self.indent(body, 2)
+        lines += ['        do arr.dispose();',
+                  f'        return {self.generate_expression(3)};', '    }', '']
+        return lines
+
+    def generate_statement(self, depth: int) -> str:
+        choice = self.random.random()
+        if depth < self.depth and choice < 0.15:
+            return self.generate_block(
+                f'if ({self.generate_condition()})', depth) + \
+                self.generate_block(' else', depth)
+        if depth < self.depth and choice < 0.25:
+            counter = self.random.choice(LOCALS)
+            return self.generate_block(
+                f'while ({counter} < {self.random.randint(2, 20)})', depth,
+                [f'let {counter} = {counter} + 1;'])
+        if choice < 0.35 and self.index > 0:
+            callee = self.random.randrange(self.index)
+            prefix = '' if callee % 2 and self.in_method else \
+                f'{self.class_name}.'
+            if callee % 2 and not self.in_method:
+                return f'let x0 = {self.generate_expression()};'
+            return f'do {prefix}sub{callee}({self.generate_expression()}, ' \
+                   f'{self.generate_expression()});'
+        if choice < 0.45:
+            return f'do Output.printInt({self.generate_expression()});'
+        target = self.random.choice(LOCALS + (FIELDS if self.in_method
+                                              else ['s0']))
+        return f'let {target} = {self.generate_expression()};'
+
+    def generate_block(self, head: str, depth: int,
+                       tail: typing.Sequence[str] = ()) -> str:
+        body = [self.generate_statement(depth + 1)
+                for _ in range(self.random.randint(1, 3))] + list(tail)
+        return '\n'.join([f'{head} {{'] + self.indent(body, 1) + ['}'])
+
+    def generate_condition(self) -> str:
+        return f'({self.generate_expression()}) ' \
+               f'{self.random.choice(COMPARISONS)} ' \
+               f'({self.generate_expression()})'
+
+    def generate_expression(self, nesting: int = 0) -> str:
+        length = self.random.randint(1, self.expression_length)
+        terms = [self.generate_term(nesting) for _ in range(length)]
+        expression = terms[0]
+        for term in terms[1:]:
+            expression += f' {self.random.choice(OPERATORS)} {term}'
+        return expression
+
+    def generate_term(self, nesting: int) -> str:
+        choice = self.random.random()
+        if choice < 0.3:
+            return str(self.random.randint(0, 1000))
+        if choice < 0.4 and nesting < 2:
+            return f'({self.generate_expression(nesting + 1)})'
+        if choice < 0.45 and nesting < 2:
+            return f'arr[{self.random.choice(LOCALS)}]'
+        if choice < 0.5:
+            return f'-{self.random.choice(LOCALS)}'
+        return self.random.choice(
+            LOCALS + ['a', 'b'] + (FIELDS if self.in_method else ['s0']))
+
+    @staticmethod
+    def indent(statements: typing.Iterable[str],
+               level: int) -> typing.List[str]:
+        return ['    ' * level + line
+                for statement in statements
+                for line in statement.split('\n')]
+
+
+def generate_corpus(classes: int = 10, **parameters) -> typing.Dict[str, str]:
+    """
+    Args:
+        classes (int): number of classes to generate.
+        parameters: passed on to CorpusGenerator.
+
+    Returns:
+        typing.Dict[str, str]: the source of each class, by class name.
+    """
+    generator = CorpusGenerator(**parameters)
+    return {f'Bench{index}': generator.generate_class(f'Bench{index}')
+            for index in range(classes)}
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument("directory")
+    parser.add_argument("--classes", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--subroutines", type=int, default=10)
+    parser.add_argument("--statements", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--strings", type=int, default=2)
+    parser.add_argument("--arrays", type=int, default=4)
+    parser.add_argument("--expression-length", type=int, default=4)
+    args = vars(parser.parse_args())
+    directory = args.pop("directory")
+    os.makedirs(directory, exist_ok=True)
+    for class_name, source in generate_corpus(**args).items():
+        with open(os.path.join(directory, class_name + ".jack"), 'w') as file:
+            file.write(source)
@@ -0,0 +1,303 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Times the compiler over generated corpora and compares the results against a
+stored baseline.
+
+    python3 benchmarks/run.py [--scenario NAME] [--save] [--check]
+
+Each scenario is compiled end to end, and the phases are also timed on their
+own: JackTokenizer over the sources, and SymbolTable and VMWriter by replaying
+the exact calls the engine made to them. The VMWriter time covers the passes
+over every subroutine and the serialization of the intermediate code into VM
+commands. The CompilationEngine time is what remains of the end to end time
+once those three are taken out.
+
+Every scenario runs in a process of its own, which reports its peak memory
+use. The process also times a fixed calibration workload, and the baseline
+stores each phase time divided by it rather than in seconds, so that a
+baseline recorded on one machine can be checked on another.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import typing
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+
+import JackCompiler  # noqa: E402
+import JackTokenizer as tokenizer_module  # noqa: E402
+import SymbolTable  # noqa: E402
+import VMWriter  # noqa: E402
+from CompilationEngine import create_passes  # noqa: E402
+from generate import generate_corpus  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCHMARKS_DIRECTORY, "baseline.json")
+# corpus parameters of each scenario, see generate.CorpusGenerator
+SCENARIOS = {
+    "small": dict(classes=20, subroutines=5, statements=10),
+    "large": dict(classes=2, subroutines=100, statements=30),
+    "deep": dict(classes=5, subroutines=10, statements=20, depth=8),
+    "strings": dict(classes=5, subroutines=10, statements=5, strings=40),
+    "arrays": dict(classes=5, subroutines=10, statements=5, arrays=40,
+                   expression_length=8),
+}
+# relative slowdown of the end to end time reported as a regression
+REGRESSION_THRESHOLD = 0.10
+PHASES = ("total", "tokenizer", "engine", "symbol_table", "writer")
+
+
+def record_calls(instance, trace: typing.List[tuple]) -> None:
+    """Makes every public method call on the instance append itself to the
+    trace before running. Only calls made from outside the instance are
+    recorded, since replaying them repeats the calls they make themselves,
+    such as VMWriter.write_subroutine() calling emit().
+    """
+    depth = [0]
+    for name in dir(type(instance)):
+        method = getattr(instance, name)
+        if name.startswith("_") or not callable(method):
+            continue
+
+        def recorder(*args, _name=name, _method=method):
+            if not depth[0]:
+                trace.append((_name, args))
+            depth[0] += 1
+            try:
+                return _method(*args)
+            finally:
+                depth[0] -= 1
+        setattr(instance, name, recorder)
+
+
+def replay(instance, trace: typing.List[tuple]) -> float:
+    """
+    Returns:
+        float: the seconds it takes to replay the traced calls on instance.
+    """
+    calls = [(getattr(instance, name), args) for name, args in trace]
+    start = time.perf_counter()
+    for method, args in calls:
+        method(*args)
+    return time.perf_counter() - start
+
+
+def time_tokenizer(sources: typing.Iterable[str]) -> typing.Tuple[float, int]:
+    """
+    Returns:
+        typing.Tuple[float, int]: the seconds it takes to tokenize the sources
+        and the number of tokens in them.
+    """
+    tokens = 0
+    start = time.perf_counter()
+    for source in sources:
+        tokenizer = tokenizer_module.JackTokenizer(io.StringIO(source))
+        while tokenizer.advance() is not None:
+            tokens += 1
+    return time.perf_counter() - start, tokens
+
+
+def time_compiler(sources: typing.Iterable[str],
+                  optimizations: typing.Collection[str]) -> float:
+    start = time.perf_counter()
+    for source in sources:
+        JackCompiler.compile_file(io.StringIO(source), io.StringIO(),
+                                  optimizations)
+    return time.perf_counter() - start
+
+
+def trace_compiler(sources: typing.Iterable[str],
+                   optimizations: typing.Collection[str]
+                   ) -> typing.Tuple[typing.List[tuple], typing.List[tuple]]:
+    """Compiles the sources once, recording the calls the engine makes to
+    its SymbolTable and VMWriter.
+    """
+    table_trace, writer_trace = [], []
+    traced = {SymbolTable.SymbolTable: table_trace,
+              VMWriter.VMWriter: writer_trace}
+    originals = {cls: cls.__init__ for cls in traced}
+
+    def traced_init(self, *args, **kwargs):
+        originals[type(self)](self, *args, **kwargs)
+        traced[type(self)].append(("__init__", ()))
+        record_calls(self, traced[type(self)])
+
+    for cls in traced:
+        cls.__init__ = traced_init
+    try:
+        for source in sources:
+            JackCompiler.compile_file(io.StringIO(source), io.StringIO(),
+                                      optimizations)
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+    return table_trace, writer_trace
+
+
+def replay_units(trace: typing.List[tuple],
+                 create: typing.Callable[[], object]) -> float:
+    """Replays a trace that spans several compilation units, each starting
+    with an "__init__" entry, on fresh instances.
+    """
+    total = 0.0
+    unit: typing.List[tuple] = []
+    for entry in trace + [("__init__", ())]:
+        if entry[0] == "__init__":
+            if unit:
+                total += replay(create(), unit)
+            unit = []
+        else:
+            unit.append(entry)
+    return total
+
+
+def calibrate() -> float:
+    """
+    Returns:
+        float: the seconds it takes to run a fixed workload of string, list
+        and dictionary operations, like those the compiler spends its time
+        on, which the phase times are divided by.
+    """
+    start = time.perf_counter()
+    counts: typing.Dict[str, int] = {}
+    for number in range(200000):
+        word = f'word{number % 997}'
+        counts[word] = counts.get(word, 0) + len(word.upper())
+    sorted(counts.items(), key=lambda item: item[1])
+    return time.perf_counter() - start
+
+
+def run_scenario(parameters: dict, repeat: int,
+                 optimizations: typing.Collection[str]) -> dict:
+    """
+    Returns:
+        dict: the best time of each phase in seconds, the best ratio of each
+        to the calibration workload timed along with it, and throughput
+        figures.
+    """
+    sources = list(generate_corpus(**parameters).values())
+    lines = sum(source.count("\n") for source in sources)
+    table_trace, writer_trace = trace_compiler(sources, optimizations)
+    passes = create_passes(optimizations)
+    results: typing.Dict[str, typing.Any] = {"relative": {}}
+    for _ in range(repeat):
+        calibration = calibrate()
+        tokenizer_time, tokens = time_tokenizer(sources)
+        timings = {
+            "total": time_compiler(sources, optimizations),
+            "tokenizer": tokenizer_time,
+            "symbol_table": replay_units(
+                table_trace, SymbolTable.SymbolTable),
+            "writer": replay_units(
+                writer_trace, lambda: VMWriter.VMWriter(
+                    io.StringIO(), passes=passes)),
+        }
+        timings["engine"] = timings["total"] - timings["tokenizer"] - \
+            timings["symbol_table"] - timings["writer"]
+        calibration = (calibration + calibrate()) / 2
+        for phase, seconds in timings.items():
+            results[phase] = min(results.get(phase, seconds), seconds)
+            ratio = seconds / calibration
+            results["relative"][phase] = min(
+                results["relative"].get(phase, ratio), ratio)
+    results["tokens_per_second"] = tokens / results["tokenizer"]
+    results["lines_per_second"] = lines / results["total"]
+    results["lines"] = lines
+    results["tokens"] = tokens
+    return results
+
+
+def run_isolated(name: str, repeat: int, optimize: bool) -> dict:
+    """Runs a scenario in a new process, so that its peak memory use is not
+    that of the scenarios run before it.
+
+    Returns:
+        dict: the results of run_scenario(), and the process's peak resident
+        set size in KiB.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", name,
+               "--repeat", str(repeat)] + (["--optimize"] if optimize else [])
+    process = subprocess.run(command, capture_output=True, text=True,
+                             check=True)
+    return json.loads(process.stdout)
+
+
+def report(name: str, results: dict, baseline: typing.Optional[dict]) -> bool:
+    """Prints the results of a scenario next to its baseline.
+
+    Returns:
+        bool: True if the end to end time regressed beyond the threshold.
+    """
+    print(f'{name}: {results["lines"]} lines, {results["tokens"]} tokens, '
+          f'{results["lines_per_second"]:,.0f} lines/s, '
+          f'{results["tokens_per_second"]:,.0f} tokens/s, '
+          f'peak RSS {results["peak_rss"] / 1024:.1f} MiB')
+    relative = results["relative"]
+    if baseline and "relative" not in baseline:
+        baseline = None  # recorded in seconds, which cannot be compared
+    for phase in PHASES:
+        line = f'  {phase:<13} {results[phase] * 1000:9.1f} ms'
+        if baseline and phase in baseline["relative"]:
+            change = relative[phase] / baseline["relative"][phase] - 1
+            line += f'  ({change:+.1%} vs baseline)'
+        print(line)
+    return bool(baseline) and relative["total"] > \
+        baseline["relative"]["total"] * (1 + REGRESSION_THRESHOLD)
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="run only the given scenarios")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="keep the best of this many runs")
+    parser.add_argument("-O", "--optimize", action="store_true",
+                        help="compile with all optimizations")
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if any scenario regressed")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    optimizations = JackCompiler.OPTIMIZATIONS if args.optimize else ()
+    if args.child:
+        results = run_scenario(SCENARIOS[args.child], args.repeat,
+                               optimizations)
+        results["peak_rss"] = \
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps(results))
+        sys.exit()
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            baselines = json.load(baseline_file)
+    key = "optimized" if args.optimize else "default"
+    all_results = {}
+    regressions = []
+    for name in args.scenario or SCENARIOS:
+        all_results[name] = run_isolated(name, args.repeat, args.optimize)
+        if report(name, all_results[name], baselines.get(key, {}).get(name)):
+            regressions.append(name)
+    if args.save:
+        baselines.setdefault(key, {}).update(
+            (name, {"lines": results["lines"], "tokens": results["tokens"],
+                    "relative": results["relative"]})
+            for name, results in all_results.items())
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=1, sort_keys=True)
+    if regressions:
+        message = f'regressed by more than {REGRESSION_THRESHOLD:.0%}: ' + \
+            ", ".join(regressions)
+        if args.check:
+            sys.exit(message)
+        print(message)
@@ -0,0 +1,84 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Checks that importing JackCompiler stays within its startup budget, and exits
+with an error if it does not.
+
+    python3 benchmarks/startup.py [--runs N]
+
+The build system starts one compiler process per changed file, so the imports
+on the common path are paid for every file. They are measured with
+"python -X importtime" as the cumulative import time of JackCompiler, keeping
+the best of several runs, and must stay under STARTUP_BUDGET_MS. Modules that
+are only needed by optional features (worker pools, statistics, profiling)
+must not be imported at all.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import typing
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+# cumulative import time of JackCompiler, in milliseconds
+STARTUP_BUDGET_MS = 100
+# modules that importing JackCompiler must not pull in
+FORBIDDEN_MODULES = frozenset(['pandas', 'numpy', 'concurrent.futures.process',
+                               'multiprocessing', 'cProfile', 'CompilerStats'])
+
+
+def measure_imports(arguments: typing.Sequence[str] = (
+        "-c", "import JackCompiler")) -> typing.Dict[str, int]:
+    """
+    Args:
+        arguments (typing.Sequence[str]): the interpreter arguments to run,
+            from the repository directory.
+
+    Returns:
+        typing.Dict[str, int]: the cumulative import time of every module
+        imported by the run, in microseconds, by module name.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True, check=True)
+    imports = {}
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports[fields[2].strip()] = int(fields[1])
+    return imports
+
+
+def check_startup(runs: int) -> typing.List[str]:
+    """
+    Args:
+        runs (int): number of runs, the fastest of which is checked.
+
+    Returns:
+        typing.List[str]: a description of every violated constraint.
+    """
+    measurements = [measure_imports() for _ in range(runs)]
+    best = min(measurements, key=lambda imports: imports["JackCompiler"])
+    startup_ms = best["JackCompiler"] / 1000
+    print(f'JackCompiler imports in {startup_ms:.1f} ms '
+          f'(budget {STARTUP_BUDGET_MS} ms)')
+    problems = [f'{name} is imported on startup'
+                for name in sorted(FORBIDDEN_MODULES.intersection(best))]
+    if startup_ms > STARTUP_BUDGET_MS:
+        problems.append(f'startup takes {startup_ms:.1f} ms, over the '
+                        f'budget of {STARTUP_BUDGET_MS} ms')
+    return problems
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument("--runs", type=int, default=5,
+                        help="keep the fastest of this many runs")
+    problems = check_startup(parser.parse_args().runs)
+    if problems:
+        sys.exit("\n".join(problems))
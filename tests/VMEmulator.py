@@ -0,0 +1,257 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Runs the ".vm" files of a program on a small VM emulator, whose OS is written
+in Python, so that tests can compare what a program prints when it is
+compiled with and without an optimization.
+"""
+import os
+import re
+import typing
+from CompilationEngine import to_word
+
+# the names the VM language allows for functions and labels
+SYMBOL_PATTERN = re.compile(r'[A-Za-z_.:][\w.:]*\Z')
+# the OS classes the standard Sys.init initializes before calling Main.main
+OS_INIT_CLASSES = ('Memory', 'Math', 'Screen', 'Output', 'Keyboard')
+STACK_BASE = 256
+STATIC_BASE = 16
+HEAP_BASE = 2048
+SEGMENT_POINTERS = {'local': 1, 'argument': 2, 'this': 3, 'that': 4}
+BINARY_OPERATIONS = {
+    'add': lambda x, y: x + y,
+    'sub': lambda x, y: x - y,
+    'and': lambda x, y: x & y,
+    'or': lambda x, y: x | y,
+    'eq': lambda x, y: -(x == y),
+    'gt': lambda x, y: -(x > y),
+    'lt': lambda x, y: -(x < y),
+}
+UNARY_OPERATIONS = {
+    'neg': lambda x: -x,
+    'not': lambda x: ~x,
+    'shiftleft': lambda x: x << 1,
+    'shiftright': lambda x: x >> 1,
+}
+
+
+class VMError(Exception):
+    """Raised when a program is not valid VM code or fails while running."""
+
+
+class Halted(Exception):
+    """Raised by Sys.halt to stop the program."""
+
+
+class VMEmulator:
+    """Loads the ".vm" files of a directory and runs them from Sys.init, or
+    from the OS initialization and Main.main if the program has no Sys.init
+    of its own.
+
+    Subroutines of the OS classes that the program does not define are
+    implemented in Python, for the parts of the OS that the tests use.
+    """
+
+    def __init__(self, directory: str, max_steps: int = 1000000) -> None:
+        """
+        Args:
+            directory (str): the directory holding the program's ".vm" files.
+            max_steps (int): the most commands to run before giving up.
+        """
+        self.max_steps = max_steps
+        self.ram = [0] * 32768
+        self.program: typing.List[typing.List[str]] = []
+        self.functions: typing.Dict[str, int] = {}
+        self.statics: typing.Dict[typing.Tuple[str, int], int] = {}
+        self.heap = HEAP_BASE
+        self.output: typing.List[str] = []
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith('.vm'):
+                self.load(os.path.join(directory, file_name))
+
+    def load(self, path: str) -> None:
+        """Appends the commands of a ".vm" file to the program, resolving the
+        labels each function jumps to.
+        """
+        unit = os.path.basename(path)[:-len('.vm')]
+        function, labels, jumps = None, {}, []
+        with open(path, 'r') as vm_file:
+            for line in vm_file:
+                command = line.split('//')[0].split()
+                if not command:
+                    continue
+                if command[0] in ('function', 'label', 'goto', 'if-goto') \
+                        and not SYMBOL_PATTERN.match(command[1]):
+                    raise VMError(f'illegal name in {line.strip()!r}')
+                if command[0] == 'function':
+                    self.resolve(labels, jumps)
+                    function, labels, jumps = command[1], {}, []
+                    self.functions[function] = len(self.program)
+                elif command[0] == 'label':
+                    labels[command[1]] = len(self.program)
+                    continue
+                elif command[0] in ('goto', 'if-goto'):
+                    jumps.append(len(self.program))
+                self.program.append(command + [unit])
+        self.resolve(labels, jumps)
+
+    def resolve(self, labels: typing.Dict[str, int],
+                jumps: typing.List[int]) -> None:
+        for position in jumps:
+            command = self.program[position]
+            if command[1] not in labels:
+                raise VMError(f'undefined label {command[1]!r}')
+            command[1] = labels[command[1]]
+
+    def run(self) -> str:
+        """
+        Returns:
+            str: everything the program printed until Main.main returned or
+            the program halted.
+        """
+        self.ram[0] = STACK_BASE
+        if 'Sys.init' in self.functions:
+            entries = ['Sys.init']
+        else:
+            entries = [f'{class_name}.init' for class_name in OS_INIT_CLASSES
+                       if f'{class_name}.init' in self.functions]
+            entries.append('Main.main')
+        try:
+            for entry in entries:
+                self.execute(self.call(entry, 0, -1))
+                self.ram[0] -= 1  # the returned value
+        except Halted:
+            pass
+        return ''.join(self.output)
+
+    def execute(self, position: int) -> None:
+        """Runs commands from the given position until the subroutine the
+        emulator called returns.
+        """
+        ram, steps = self.ram, 0
+        while position >= 0:
+            steps += 1
+            if steps > self.max_steps:
+                raise VMError('step limit exceeded')
+            command = self.program[position]
+            position += 1
+            operation = command[0]
+            if operation == 'push':
+                value = int(command[2]) if command[1] == 'constant' else \
+                    ram[self.address(command[1], int(command[2]), command[3])]
+                self.push(value)
+            elif operation == 'pop':
+                value = self.pop()
+                ram[self.address(command[1], int(command[2]),
+                                 command[3])] = value
+            elif operation in BINARY_OPERATIONS:
+                y, x = self.pop(), self.pop()
+                self.push(BINARY_OPERATIONS[operation](x, y))
+            elif operation in UNARY_OPERATIONS:
+                self.push(UNARY_OPERATIONS[operation](self.pop()))
+            elif operation == 'goto':
+                position = command[1]
+            elif operation == 'if-goto':
+                if self.pop() != 0:
+                    position = command[1]
+            elif operation == 'call':
+                position = self.call(command[1], int(command[2]), position)
+            elif operation == 'function':
+                for _ in range(int(command[2])):
+                    self.push(0)
+            elif operation == 'return':
+                frame = ram[1]
+                position = ram[frame - 5]
+                ram[ram[2]] = ram[ram[0] - 1]
+                ram[0] = ram[2] + 1
+                ram[4], ram[3], ram[2], ram[1] = ram[frame - 1:frame - 5:-1]
+            else:
+                raise VMError(f'unknown command {operation!r}')
+
+    def address(self, segment: str, index: int, unit: str) -> int:
+        if segment in SEGMENT_POINTERS:
+            return self.ram[SEGMENT_POINTERS[segment]] + index
+        if segment == 'temp' and 0 <= index < 8:
+            return 5 + index
+        if segment == 'pointer' and index in (0, 1):
+            return 3 + index
+        if segment == 'static':
+            return self.statics.setdefault(
+                (unit, index), STATIC_BASE + len(self.statics))
+        raise VMError(f'illegal memory access {segment} {index}')
+
+    def push(self, value: int) -> None:
+        self.ram[self.ram[0]] = to_word(value)
+        self.ram[0] += 1
+
+    def pop(self) -> int:
+        self.ram[0] -= 1
+        return self.ram[self.ram[0]]
+
+    def call(self, name: str, n_args: int, return_position: int) -> int:
+        """Calls a subroutine, after its arguments were pushed.
+
+        Returns:
+            int: the position to continue from.
+        """
+        ram = self.ram
+        if name not in self.functions:
+            arguments = ram[ram[0] - n_args:ram[0]]
+            ram[0] -= n_args
+            self.push(self.call_os(name, arguments))
+            return return_position
+        for value in (return_position, ram[1], ram[2], ram[3], ram[4]):
+            self.push(value)
+        ram[2] = ram[0] - n_args - 5
+        ram[1] = ram[0]
+        return self.functions[name]
+
+    def call_os(self, name: str, arguments: typing.List[int]) -> int:
+        """Runs an OS subroutine that the program does not define.
+
+        Returns:
+            int: its returned value.
+        """
+        ram = self.ram
+        if name == 'Math.multiply':
+            return arguments[0] * arguments[1]
+        if name == 'Math.divide':
+            if arguments[1] == 0:
+                raise VMError('division by zero')
+            quotient = abs(arguments[0]) // abs(arguments[1])
+            return quotient if (arguments[0] < 0) == (arguments[1] < 0) \
+                else -quotient
+        if name in ('Memory.alloc', 'Array.new'):
+            address = self.heap
+            self.heap += max(arguments[0], 1)
+            return address
+        if name in ('Memory.deAlloc', 'Array.dispose', 'String.dispose'):
+            return 0
+        if name == 'String.new':
+            address = self.call_os('Memory.alloc', [arguments[0] + 1])
+            ram[address] = 0
+            return address
+        if name == 'String.appendChar':
+            string = arguments[0]
+            ram[string] += 1
+            ram[string + ram[string]] = arguments[1]
+            return string
+        if name == 'Output.printInt':
+            self.output.append(str(arguments[0]))
+        elif name == 'Output.printChar':
+            self.output.append(chr(arguments[0]))
+        elif name == 'Output.printString':
+            string = arguments[0]
+            self.output.extend(chr(ram[string + offset])
+                               for offset in range(1, ram[string] + 1))
+        elif name == 'Output.println':
+            self.output.append('\n')
+        elif name == 'Sys.halt':
+            raise Halted()
+        else:
+            raise VMError(f'undefined subroutine {name!r}')
+        return 0
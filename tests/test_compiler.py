@@ -0,0 +1,143 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+
+import pytest
+
+from AsyncCompiler import compile_many
+from BuildCache import BuildCache, MANIFEST_NAME
+from JackCompiler import Compiler, OPTIMIZATIONS, build
+
+# a class calling its own function, method and constructor without naming the
+# class, which only resolve correctly through an index
+SOURCES = {
+    "Main": """
+class Main {
+    function void main() {
+        var Counter counter;
+        let counter = Counter.new(helper(3));
+        do counter.bump();
+        do Output.printInt(counter.get());
+        return;
+    }
+    function int helper(int x) { return x + x; }
+}
+""",
+    "Counter": """
+class Counter {
+    field int count;
+    constructor Counter new(int start) { let count = start; return this; }
+    method void bump() { do add(1); return; }
+    method void add(int n) { let count = count + n; return; }
+    method int get() { return count; }
+}
+""",
+}
+
+
+def build_sources(directory, optimizations, jobs=1):
+    """Builds SOURCES in the given directory.
+
+    Returns:
+        typing.List[str]: the paths of the sources.
+    """
+    input_paths = []
+    for name, source in SOURCES.items():
+        input_path = directory / f"{name}.jack"
+        input_path.write_text(source)
+        input_paths.append(str(input_path))
+    cache = BuildCache(str(directory / MANIFEST_NAME))
+    _, errors = build(sorted(input_paths), cache, jobs=jobs,
+                      optimizations=optimizations)
+    assert errors == {}
+    return input_paths
+
+
+@pytest.mark.parametrize("optimizations", [(), OPTIMIZATIONS])
+def test_compiler_matches_build(tmp_path, optimizations):
+    build_sources(tmp_path, optimizations)
+    compiler = Compiler(optimizations)
+    for name, source in SOURCES.items():
+        expected = (tmp_path / f"{name}.vm").read_text()
+        assert compiler.compile(source) == expected
+        assert compiler.compile(source.encode()) == expected
+        output_file = io.StringIO()
+        compiler.compile_stream(io.StringIO(source), output_file)
+        assert output_file.getvalue() == expected
+
+
+@pytest.mark.parametrize("optimizations", [(), OPTIMIZATIONS])
+def test_worker_processes_match_build(tmp_path, optimizations):
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "parallel").mkdir()
+    build_sources(tmp_path / "serial", optimizations)
+    build_sources(tmp_path / "parallel", optimizations, jobs=2)
+    for name in SOURCES:
+        assert (tmp_path / "parallel" / f"{name}.vm").read_text() == \
+            (tmp_path / "serial" / f"{name}.vm").read_text()
+
+
+@pytest.mark.parametrize("optimizations", [(), OPTIMIZATIONS])
+def test_compile_many_matches_build(tmp_path, optimizations):
+    input_paths = build_sources(tmp_path, optimizations)
+    expected = {}
+    for input_path in input_paths:
+        output_path = input_path[:-len(".jack")] + ".vm"
+        with open(output_path) as output_file:
+            expected[output_path] = output_file.read()
+        os.remove(output_path)
+    truncated = str(tmp_path / "Truncated.jack")
+    with open(truncated, "w") as truncated_file:
+        truncated_file.write("class Truncated { function void f() {")
+    missing = str(tmp_path / "Missing.jack")
+
+    async def compile_all():
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            return {path: error async for path, error in compile_many(
+                input_paths + [truncated, missing],
+                optimizations=optimizations, executor=executor)}
+
+    errors = asyncio.run(compile_all())
+    assert {path for path, error in errors.items() if error} == \
+        {truncated, missing}
+    assert "expected '}', found end of file" in errors[truncated]
+    assert "FileNotFoundError" in errors[missing]
+    for output_path, output in expected.items():
+        with open(output_path) as output_file:
+            assert output_file.read() == output
+
+
+def test_cache_forgets_deleted_sources(tmp_path):
+    input_paths = build_sources(tmp_path, ())
+    math_path = tmp_path / "Math.jack"
+    math_path.write_text(
+        "class Math { function int twice(int x) { return x + x; } }")
+    cache = BuildCache(str(tmp_path / MANIFEST_NAME))
+    build(sorted(input_paths + [str(math_path)]), cache)
+    assert cache.index.lookup("Math", "multiply") is None
+    (tmp_path / "Counter.jack").rename(tmp_path / "Tally.jack")
+    math_path.unlink()
+    input_paths = sorted(str(path) for path in tmp_path.glob("*.jack"))
+    _, errors = build(input_paths, cache)
+    assert errors == {}
+    with open(tmp_path / MANIFEST_NAME) as manifest_file:
+        units = json.load(manifest_file)["units"]
+    assert sorted(units) == ["Main.jack", "Tally.jack"]
+    assert "Counter" in cache.index
+    assert cache.index.lookup("Math", "twice") is None
+    assert cache.index.lookup("Math", "multiply") is not None
+    # a fresh cache drops the entries of the manifest in the same way
+    (tmp_path / "Tally.jack").unlink()
+    build([str(tmp_path / "Main.jack")], BuildCache(
+        str(tmp_path / MANIFEST_NAME)))
+    with open(tmp_path / MANIFEST_NAME) as manifest_file:
+        assert sorted(json.load(manifest_file)["units"]) == ["Main.jack"]
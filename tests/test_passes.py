@@ -0,0 +1,263 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+Differential tests of the optimization passes: every program is compiled with
+and without the pass, and both builds must print the same output when run.
+"""
+import pytest
+
+from BuildCache import BuildCache, MANIFEST_NAME
+from JackCompiler import OPTIMIZATIONS, build
+from VMEmulator import VMEmulator
+
+# the optimizations each pass is tested on top of, besides itself
+BASELINES = [(), OPTIMIZATIONS]
+
+
+def run_program(directory, sources, optimizations):
+    """Builds the given sources in a new directory and runs them.
+
+    Returns:
+        typing.Tuple[str, typing.Dict[str, str]]: what the program printed,
+        and the VM code of every class by name.
+    """
+    directory.mkdir()
+    input_paths = []
+    for name, source in sources.items():
+        input_path = directory / f"{name}.jack"
+        input_path.write_text(source)
+        input_paths.append(str(input_path))
+    cache = BuildCache(str(directory / MANIFEST_NAME))
+    _, errors = build(sorted(input_paths), cache,
+                      optimizations=optimizations)
+    assert errors == {}
+    code = {name: (directory / f"{name}.vm").read_text() for name in sources}
+    return VMEmulator(str(directory)).run(), code
+
+
+def run_with_and_without(tmp_path, sources, baseline, optimization):
+    """Runs the sources built with the baseline optimizations, with and
+    without the given one, and checks that they print the same.
+
+    Returns:
+        typing.Tuple[str, typing.Dict[str, str]]: what the program printed,
+        and the VM code of every class built with the optimization.
+    """
+    baseline = [name for name in baseline if name != optimization]
+    expected, _ = run_program(tmp_path / "without", sources, baseline)
+    output, code = run_program(tmp_path / "with", sources,
+                               [*baseline, optimization])
+    assert output == expected
+    return output, code
+
+
+def function_header(code, name):
+    """
+    Returns:
+        str: the "function" command that declares the named function.
+    """
+    return next(line for line in code.splitlines()
+                if line.startswith(f"function {name} "))
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_locals_share_slots(tmp_path, baseline):
+    # "unset" is read before it is written, so it must keep a slot of its
+    # own that the VM clears
+    sources = {"Main": """
+class Main {
+    function int sum(int n) {
+        var int i, total, j, product, unset;
+        let i = 0;
+        let total = 0;
+        while (i < n) { let total = total + i; let i = i + 1; }
+        let j = 1;
+        let product = 1;
+        while (j < n) { let product = product * j; let j = j + 1; }
+        do Output.printInt(unset);
+        let unset = total + product;
+        return unset;
+    }
+    function void main() {
+        do Output.printInt(Main.sum(5));
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline,
+                                        "locals")
+    assert output == "034"
+    assert function_header(code["Main"], "Main.sum") != "function Main.sum 5"
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_inline_clears_locals_read_before_written(tmp_path, baseline):
+    # the temp slot of "total" still holds 5 from the first inlined call
+    sources = {"Main": """
+class Main {
+    function int accumulate(int x) {
+        var int total;
+        let total = total + x;
+        return total;
+    }
+    function void main() {
+        do Output.printInt(Main.accumulate(5));
+        do Output.printInt(Main.accumulate(7));
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline,
+                                        "inline")
+    assert output == "57"
+    assert "call Main.accumulate" not in code["Main"]
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_inline_restores_the_callers_this(tmp_path, baseline):
+    sources = {"Main": """
+class Main {
+    function void main() {
+        var Box first, second;
+        let first = Box.new(3);
+        let second = Box.new(0);
+        do first.copyTo(second);
+        return;
+    }
+}
+""", "Box": """
+class Box {
+    field int value;
+    constructor Box new(int start) { let value = start; return this; }
+    method void set(int v) { let value = v; return; }
+    method int get() { return value; }
+    method void copyTo(Box other) {
+        do other.set(value + 1);
+        do Output.printInt(value);
+        do Output.printInt(other.get());
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline,
+                                        "inline")
+    assert output == "34"
+    assert "call Box.set" not in code["Box"]
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_inline_keeps_calls_that_need_too_many_temps(tmp_path, baseline):
+    # five arguments and two locals live at once do not fit INLINE_TEMPS
+    sources = {"Main": """
+class Main {
+    function int mix(int a, int b, int c, int d, int e) {
+        var int x, y;
+        let x = a + b;
+        let y = c + d;
+        return x - y + e;
+    }
+    function void main() {
+        do Output.printInt(Main.mix(1, 2, 3, 4, 5));
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline,
+                                        "inline")
+    assert output == "1"
+    assert "call Main.mix 5" in code["Main"]
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_cfg_inverts_branches_on_comparisons(tmp_path, baseline):
+    sources = {"Main": """
+class Main {
+    function int sign(int x) {
+        if (x < 0) { return -1; }
+        if (x > 0) { return 1; }
+        return 0;
+    }
+    function void main() {
+        var int i, evens;
+        let i = -3;
+        while (i < 4) {
+            do Output.printInt(Main.sign(i));
+            if (i = (i / 2 * 2)) {
+                let evens = evens + 1;
+            } else {
+                if (i > 1) { do Output.printChar(43); }
+            }
+            let i = i + 1;
+        }
+        do Output.printInt(evens);
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline, "cfg")
+    assert output == "-1-1-10111+3"
+    # the second test of sign() and the test of the if-else branch on the
+    # comparison itself
+    assert "gt\nif-goto" in code["Main"]
+    assert "eq\nif-goto" in code["Main"]
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_dce_folds_branches_on_constants(tmp_path, baseline):
+    sources = {"Main": """
+class Main {
+    function void unused() { do Output.printInt(9); return; }
+    function void main() {
+        var int i;
+        if (false) { do Output.printInt(1); } else { do Output.printInt(2); }
+        while (true) {
+            let i = i + 1;
+            if (i > 2) { do Output.printInt(i); return; }
+        }
+        do Output.printInt(4);
+        return;
+    }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline, "dce")
+    assert output == "23"
+    assert "function Main.unused" not in code["Main"]
+    for dead in ("push constant 1\ncall", "push constant 4\ncall"):
+        assert dead not in code["Main"]
+    assert code["Main"].count("if-goto") == 1
+
+
+@pytest.mark.parametrize("baseline", BASELINES)
+def test_dce_keeps_os_entry_points_without_sys_init(tmp_path, baseline):
+    # the standard Sys.init calls Math.init, which nothing in the program
+    # calls
+    sources = {"Main": """
+class Main {
+    function void main() {
+        var int x, y;
+        let x = 3;
+        let y = 5;
+        do Output.printInt(x * y);
+        return;
+    }
+}
+""", "Math": """
+class Math {
+    static int offset;
+    function void init() { let offset = 10; return; }
+    function int multiply(int x, int y) {
+        var int sum;
+        while (y > 0) { let sum = sum + x; let y = y - 1; }
+        return sum + offset;
+    }
+    function int twice(int x) { return x + x; }
+}
+"""}
+    output, code = run_with_and_without(tmp_path, sources, baseline, "dce")
+    assert output == "25"
+    assert "function Math.init" in code["Math"]
+    assert "function Math.twice" not in code["Math"]
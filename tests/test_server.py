@@ -0,0 +1,38 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import socket
+
+import pytest
+
+from CompileServer import remove_stale_socket
+
+
+def test_stale_socket_is_removed(tmp_path):
+    socket_path = tmp_path / "server.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+    remove_stale_socket(str(socket_path))
+    assert not socket_path.exists()
+
+
+def test_socket_of_a_running_server_is_kept(tmp_path):
+    socket_path = tmp_path / "server.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        with pytest.raises(FileExistsError, match="already listening"):
+            remove_stale_socket(str(socket_path))
+        assert socket_path.exists()
+
+
+def test_other_files_are_kept(tmp_path):
+    socket_path = tmp_path / "Main.jack"
+    socket_path.write_text("class Main {}")
+    with pytest.raises(FileExistsError, match="not a socket"):
+        remove_stale_socket(str(socket_path))
+    assert socket_path.read_text() == "class Main {}"
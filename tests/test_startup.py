@@ -0,0 +1,19 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+from benchmarks.startup import (FORBIDDEN_MODULES, check_startup,
+                                measure_imports)
+
+
+def test_import_within_budget():
+    assert check_startup(runs=5) == []
+
+
+def test_command_line_imports_no_optional_modules():
+    imports = measure_imports(["JackCompiler.py", "--help"])
+    assert "argparse" in imports
+    assert sorted(FORBIDDEN_MODULES.intersection(imports)) == []
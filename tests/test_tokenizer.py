@@ -0,0 +1,58 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import re
+
+import pytest
+
+from BuildCache import BuildCache, MANIFEST_NAME
+from JackCompiler import Compiler, build
+from JackTokenizer import CompilationError, JackTokenizer
+
+SOURCE = """class Main {
+    function void main() {
+        do Output.printInt(1);  // $ in a comment
+        do Output.printString("$ in a string");
+        return;
+    }
+}
+"""
+
+
+def test_scan_skips_comments_and_whitespace():
+    lexemes = list(JackTokenizer.scan(SOURCE))
+    assert ("stringConstant", '"$ in a string"') in lexemes
+    assert all(group in ("word", "symbol", "stringConstant")
+               for group, _ in lexemes)
+
+
+@pytest.mark.parametrize("source, message", [
+    (SOURCE.replace("1);", "1 $ 2);"), "line 3: unexpected character '$'"),
+    (SOURCE.replace("main()", "main@()"),
+     "line 2: unexpected character '@'"),
+    (SOURCE.replace('string")', "string)"),
+     "line 4: unterminated string constant"),
+    (SOURCE.replace("return;", "return caf\u00e9;"),
+     "line 5: unexpected character '\u00e9'"),
+], ids=["symbol", "identifier", "string", "not ascii"])
+def test_unknown_characters_are_reported(source, message):
+    with pytest.raises(CompilationError, match=re.escape(message)):
+        list(JackTokenizer.scan(source))
+    with pytest.raises(CompilationError, match=re.escape(message)):
+        list(JackTokenizer.scan_bytes(source.encode()))
+    with pytest.raises(CompilationError, match=re.escape(message)):
+        Compiler().compile(source)
+
+
+def test_build_reports_unknown_characters(tmp_path):
+    input_path = tmp_path / "Main.jack"
+    input_path.write_text(SOURCE.replace("1);", "1 $ 2);"))
+    cache = BuildCache(str(tmp_path / MANIFEST_NAME))
+    _, errors = build([str(input_path)], cache)
+    assert errors == {str(input_path): f"{input_path}: CompilationError: "
+                                       f"line 3: unexpected character '$'"}
+    assert not (tmp_path / "Main.vm").exists()